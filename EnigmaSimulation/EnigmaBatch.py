@@ -0,0 +1,174 @@
+# Batch encryption/decryption from the command line - many messages, each with its own key
+#
+#   python EnigmaBatch.py messages.jsonl -o out.jsonl --workers 8
+#
+# One message per JSONL line (or CSV row, list fields space separated):
+#   id            - passed through to the output
+#   text          - text to encrypt/decrypt
+#   rotors        - [left, middle, right] rotor choices, numbered as in EnigmaMachine.setRotor
+#   ringSetting   - [right, middle, left], as in EnigmaMachine.setRingSetting
+#   rotorRotation - [right, middle, left] start rotations, as in EnigmaMachine.setRotorRotation
+#   reflector     - A, B, C, Bt, Ct or a full cipherbet
+#   plugboard     - pairs as in EnigmaMachine.setPlugboard, e.g. "AB CD"
+#   navyRotor     - optional navy rotor choice (10 or 11)
+# Output is one line/row per message in input order, with id and text, or id and error (a JSONL line that is
+# not valid JSON gets an error row naming its line number)
+
+import argparse
+import collections
+import concurrent.futures
+import csv
+import json
+import os
+import sys
+
+from EnigmaCore import *
+
+reflectorNames = {'A': reflectorA, 'B': reflectorB, 'C': reflectorC, 'Bt': reflectorBt, 'Ct': reflectorCt}
+
+# Input line that could not be read as a message, turned into an error row by cryptMessage
+BadMessage = collections.namedtuple('BadMessage', ['line', 'error'])
+
+def numberList(value):
+    if isinstance(value, str):
+        value = value.replace(',', ' ').split()
+    if not isinstance(value, (list, tuple)):
+        raise TypeError('expected a list of numbers, got %r' % (value,))
+    return tuple(int(number) for number in value)
+
+def checkedNumbers(value, name, allowed, count):
+    numbers = numberList(value)
+    if len(numbers) != count or any(number not in allowed for number in numbers):
+        raise ValueError('%s must be %d numbers in %d..%d, got %r' % (name, count, min(allowed), max(allowed), value))
+    return numbers
+
+# Key fields of a message as a hashable tuple - the start rotation is not part of the key,
+# so messages of one daily key share its tables whatever their start positions.  The plugboard is keyed by
+# the board setPlugboard builds, so spellings of one board share an entry
+def messageKey(message):
+    reflector = message.get('reflector') or 'B'
+    if not isinstance(reflector, str):
+        raise TypeError('reflector must be a name or a cipherbet, got %r' % (reflector,))
+    reflector = reflectorNames.get(reflector, reflector)
+    if sorted(reflector) != list(alphabet):
+        raise ValueError('unknown reflector %r' % (reflector,))
+    plugboard = message.get('plugboard') or ''
+    if not isinstance(plugboard, str):
+        raise TypeError('plugboard must be a string of pairs, got %r' % (plugboard,))
+    navy = message.get('navyRotor')
+    navy = int(navy) if navy not in (None, '') else None
+    if navy not in (None, 10, 11):
+        raise ValueError('navyRotor must be 10 or 11, got %r' % (navy,))
+    return (checkedNumbers(message.get('rotors') or (3, 2, 1), 'rotors', range(1, 9), 3),
+            checkedNumbers(message.get('ringSetting') or (1, 1, 1), 'ringSetting', range(1, 27), 3),
+            reflector, bytes(parsePlugboard(plugboard.upper(), PLUGBOARD_CABLES)), navy)
+
+# Compiled engine of a message key from the process wide keySchedule cache
+def keyEngine(key):
+    def build():
+        rotors, ringSetting, reflector, plugboard, navy = key
+        return CompiledEnigma(EnigmaMachine.fromKey(rotors, ringSetting, reflector, plugboardString(plugboard), navy))
+    return keySchedule.engine(key, build)
+
+# Any failure of a message - bad field, text the machine cannot encipher - becomes its error row
+def cryptMessage(message):
+    if isinstance(message, BadMessage):
+        return {'id': None, 'error': 'line %d: %s' % (message.line, message.error)}
+    try:
+        if not isinstance(message, dict):
+            raise TypeError('message must be an object, got %r' % (message,))
+        text = message.get('text', '')
+        if not isinstance(text, str):
+            raise TypeError('text must be a string, got %r' % (text,))
+        engine = keyEngine(messageKey(message))
+        rotation = list(checkedNumbers(message.get('rotorRotation') or (1, 1, 1), 'rotorRotation', range(1, 27), 3))
+        return {'id': message.get('id'), 'text': engine.cryption(text, rotation)[0]}
+    except Exception as error:
+        return {'id': message.get('id') if isinstance(message, dict) else None,
+                'error': '%s: %s' % (type(error).__name__, error)}
+
+def cryptBatch(messages):
+    return [cryptMessage(message) for message in messages]
+
+def initWorker(keyCacheSize):
+    keySchedule.maxSize = keyCacheSize
+
+
+def readMessages(source, inputFormat):
+    if inputFormat == 'csv':
+        for row in csv.DictReader(source):
+            yield row
+    else:
+        for number, line in enumerate(source, 1):
+            if line.strip():
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError as error:
+                    yield BadMessage(number, '%s: %s' % (type(error).__name__, error))
+
+def batches(messages, batchSize):
+    batch = []
+    for message in messages:
+        batch.append(message)
+        if len(batch) == batchSize:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+# Results of every message in input order.  At most workers * 4 batches are in flight, so the input is read
+# as the output is written and memory does not grow with the number of messages
+def cryptMessages(messages, workers=None, batchSize=1000, keyCacheSize=1024):
+    if workers == 1:
+        initWorker(keyCacheSize)
+        for batch in batches(messages, batchSize):
+            yield from cryptBatch(batch)
+        return
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=initWorker,
+                                                initargs=(keyCacheSize,)) as executor:
+        window = (workers or os.cpu_count() or 1) * 4
+        pending = collections.deque()
+        for batch in batches(messages, batchSize):
+            pending.append(executor.submit(cryptBatch, batch))
+            if len(pending) >= window:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+def writeResults(results, destination, outputFormat):
+    if outputFormat == 'csv':
+        writer = csv.DictWriter(destination, fieldnames=['id', 'text', 'error'])
+        writer.writeheader()
+        for result in results:
+            writer.writerow(result)
+    else:
+        for result in results:
+            destination.write(json.dumps(result) + '\n')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Encrypt/decrypt many messages, each with its own Enigma key')
+    parser.add_argument('input', help='JSONL or CSV file of messages, - for stdin')
+    parser.add_argument('-o', '--output', default='-', help='output file, - for stdout')
+    parser.add_argument('--format', choices=['jsonl', 'csv'], help='input/output format, by default from the input extension')
+    parser.add_argument('--workers', type=int, help='worker processes, 1 to run in this process')
+    parser.add_argument('--batch-size', type=int, default=1000, help='messages per work unit')
+    parser.add_argument('--key-cache-size', type=int, default=1024, help='compiled keys kept per worker')
+    args = parser.parse_args(argv)
+
+    inputFormat = args.format or ('csv' if args.input.lower().endswith('.csv') else 'jsonl')
+    source = sys.stdin if args.input == '-' else open(args.input, newline='')
+    destination = sys.stdout if args.output == '-' else open(args.output, 'w', newline='')
+    try:
+        results = cryptMessages(readMessages(source, inputFormat), args.workers, args.batch_size, args.key_cache_size)
+        writeResults(results, destination, inputFormat)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if destination is not sys.stdout:
+            destination.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,325 @@
+# Benchmarks of the cipher, stepping and Bombe hot paths
+#
+#   python EnigmaBenchmark.py -o before.json
+#   python EnigmaBenchmark.py -o after.json --compare before.json
+#
+# Texts and keys come from a fixed seed, every benchmark reports the best of its repeats.
+# Results are written as JSON, --compare prints the ratio to an earlier run and exits 1 when
+# a benchmark got slower than --threshold
+#
+# --core benchmarks the engine of another tree, e.g. one from before EnigmaCore existed:
+#
+#   python EnigmaBenchmark.py -o baseline.json --core /path/to/old/EnigmaSimulation.py
+#
+# The file's own imports must be installed (pygame for such a tree), its interface is never started.
+# Benchmarks of APIs the loaded engine does not have are skipped.  The reference benchmarks (the per-letter
+# rotateRotors + cipher path and EnigmaMachine.cryption on a text it can encipher) run on every tree, so
+# they are the ones to compare across the whole history
+
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import types
+
+SEED = 1939
+
+# Text sizes for the cryption benchmarks, in letters
+SIZES = {'1KB': 1 << 10, '64KB': 1 << 16, '1MB': 1 << 20, '16MB': 1 << 24, '100MB': 100 * (1 << 20)}
+
+# Reference benchmarks - text size and a plugboard every version of setPlugboard takes in full
+REFERENCE_SIZE = '16KB'
+REFERENCE_LETTERS = 1 << 14
+REFERENCE_PLUGBOARD = 'AQ BW CE DR FT GY'
+
+CRIB_PLAIN = 'WETTERVORHERSAGEFUERDIEREGIONNORDSEE'
+CRIB = 'WETTERVORHERSAGEFUERDIE'
+
+# Engine module being benchmarked and its numpy (None without numpy or an engine without array modes)
+core = None
+np = None
+
+
+# Engine to benchmark - EnigmaCore of this tree by default, or the file at path.  Trees from before EnigmaCore
+# kept the engine and the pygame interface in EnigmaSimulation.py, only the part before the interface
+# (pg.init()) is run from such a file
+def loadCore(path=None):
+    global core, np
+    if path is None:
+        import EnigmaCore
+        core = EnigmaCore
+    else:
+        sys.path.insert(0, os.path.dirname(os.path.abspath(path)))
+        with open(path) as f:
+            source = f.read()
+        interface = source.find('\npg.init()')
+        if interface >= 0:
+            source = source[:interface]
+        core = types.ModuleType('benchmarkCore')
+        core.__file__ = path
+        exec(compile(source, path, 'exec'), core.__dict__)
+    np = core.numpyModule() if hasattr(core, 'numpyModule') else None
+    return core
+
+def randomText(length, seed=SEED):
+    generator = random.Random(seed)
+    return ''.join(generator.choices(core.alphabet, k=length))
+
+def standardMachine(plugboard='AQ BW CE DR FT GY HU IJ KL ZX'):
+    machine = core.EnigmaMachine(core.rotor3, core.rotor2, core.rotor1, core.reflectorB, None, plugboard)
+    machine.setRingSetting([1, 1, 1])
+    machine.setRotorRotation([1, 1, 1])
+    return machine
+
+def navyMachine():
+    machine = core.EnigmaMachine(core.rotor3, core.rotor2, core.rotor1, core.reflectorBt, core.rotorBeta,
+                                 'AQ BW CE DR FT GY HU IJ KL ZX')
+    machine.setRingSetting([1, 1, 1])
+    machine.setRotorRotation([1, 1, 1])
+    return machine
+
+# Text of length letters the per-letter cipher enciphers from the reference key.  The original cipher raises
+# IndexError for some letter/rotation pairs, so at each position letters are drawn until one enciphers
+def referenceText(length, seed=SEED):
+    generator = random.Random(seed)
+    machine = standardMachine(REFERENCE_PLUGBOARD)
+    letters = []
+    for i in range(length):
+        machine.rotateRotors()
+        while True:
+            letter = generator.choice(core.alphabet)
+            try:
+                machine.cipher(letter)
+                break
+            except IndexError:
+                pass
+        letters.append(letter)
+    return ''.join(letters)
+
+# Best time of repeats calls of run(), setup() runs untimed before each call
+def measure(run, setup=None, repeats=5):
+    best = None
+    for i in range(repeats):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def benchMapLetter(repeats):
+    wheel = core.rotor1
+    if hasattr(core.rotor, 'fromWiring'):
+        wheel = core.rotor.fromWiring(wheel)
+    wheel.setRing(3)
+    wheel.setRotate(7)
+    count = 100000
+
+    def run():
+        for i in range(count):
+            wheel.mapLetter(i % 25 + 1, 1 + i % 2)
+    return {'seconds': measure(run, repeats=repeats), 'operations': count}
+
+def benchRotateRotors(repeats):
+    machine = standardMachine()
+    count = 100000
+
+    def run():
+        for i in range(count):
+            machine.rotateRotors()
+    return {'seconds': measure(run, repeats=repeats), 'operations': count}
+
+def benchSeek(repeats):
+    machine = standardMachine()
+    count = 10000
+
+    def run():
+        for i in range(count):
+            machine.seek(1000003)
+    return {'seconds': measure(run, repeats=repeats), 'operations': count}
+
+def benchPlugboard(repeats):
+    count = 10000
+
+    def run():
+        machine = standardMachine()
+        for i in range(count):
+            machine.setPlugboard('')
+            machine.setPlugboard('AQ BW CE DR FT GY HU IJ KL ZX')
+    return {'seconds': measure(run, repeats=repeats), 'operations': count}
+
+def benchCompile(repeats):
+    machine = standardMachine()
+    count = 100
+
+    def run():
+        for i in range(count):
+            core.CompiledEnigma(machine)
+    return {'seconds': measure(run, repeats=repeats), 'operations': count}
+
+# Per-letter reference path - rotateRotors and cipher for every letter, as the original cryption did
+def benchReferenceCipher(text, repeats):
+    machine = standardMachine(REFERENCE_PLUGBOARD)
+
+    def setup():
+        machine.setRotorRotation([1, 1, 1])
+
+    def run():
+        for letter in text:
+            machine.rotateRotors()
+            machine.cipher(letter)
+    return {'seconds': measure(run, setup, repeats), 'operations': len(text)}
+
+def benchReferenceCryption(text, repeats):
+    machine = standardMachine(REFERENCE_PLUGBOARD)
+
+    def setup():
+        machine.setRotorRotation([1, 1, 1])
+    return {'seconds': measure(lambda: machine.cryption(text), setup, repeats), 'operations': len(text)}
+
+def benchCryption(text, makeMachine, repeats):
+    machine = makeMachine()
+    machine.compile()
+
+    def setup():
+        machine.setRotorRotation([1, 1, 1])
+    return {'seconds': measure(lambda: machine.cryption(text), setup, repeats), 'operations': len(text)}
+
+def benchBulkCryption(text, repeats):
+    machine = standardMachine()
+    letters = np.frombuffer(text.encode('ascii'), dtype=np.uint8) - ord('A')
+    machine.compile().stateArray()
+
+    def setup():
+        machine.setRotorRotation([1, 1, 1])
+    return {'seconds': measure(lambda: machine.cryptionArray(letters), setup, repeats), 'operations': len(text)}
+
+def benchMultiKey(repeats):
+    generator = random.Random(SEED)
+    keys = [core.EnigmaKey(tuple(generator.sample(range(1, 9), 3)), core.reflectorB, (1, 1, 1),
+                           [generator.randint(1, 26) for i in range(3)], 'AQ BW CE DR FT GY HU IJ KL ZX')
+            for k in range(1000)]
+    text = randomText(256)
+
+    def run():
+        core.MultiKeyEnigma(keys).cryption(text)
+    return {'seconds': measure(run, repeats=repeats), 'operations': len(keys) * len(text)}
+
+def benchBombe(repeats):
+    machine = standardMachine('AQ BW CE DR FT GY')
+    machine.setRotorRotation([7, 20, 3])
+    encryptedText = machine.cryption(CRIB_PLAIN)
+    rotorOrders = [(1, 2, 3), (2, 3, 4), (3, 4, 5), (4, 5, 1)]
+
+    bombe = core.BombeMachine()
+
+    def setup():
+        bombe.resetBombe()
+        bombe.setCrib(CRIB, encryptedText)
+    return {'seconds': measure(lambda: bombe.runBombe(rotorOrders, [core.reflectorB]), setup, repeats),
+            'operations': len(rotorOrders) * 26 ** 3}
+
+
+def runBenchmarks(sizes, repeats, quick=False):
+    results = {}
+    compiled = hasattr(core, 'CompiledEnigma')
+
+    def record(name, result):
+        result['perOperation'] = result['seconds'] / result['operations']
+        results[name] = result
+        print('%-28s %10.4f s  %12.1f ns/op' % (name, result['seconds'], result['perOperation'] * 1e9), file=sys.stderr)
+
+    record('rotor.mapLetter', benchMapLetter(repeats))
+    record('EnigmaMachine.rotateRotors', benchRotateRotors(repeats))
+    if hasattr(core.EnigmaMachine, 'seek'):
+        record('EnigmaMachine.seek', benchSeek(repeats))
+    record('EnigmaMachine.setPlugboard', benchPlugboard(repeats))
+    text = referenceText(REFERENCE_LETTERS)
+    record('reference.cipher.%s' % REFERENCE_SIZE, benchReferenceCipher(text, repeats))
+    record('reference.cryption.%s' % REFERENCE_SIZE, benchReferenceCryption(text, repeats))
+    if not compiled:
+        return results
+
+    # Any text from here on - the compiled engine has no letter/rotation it cannot encipher
+    record('CompiledEnigma', benchCompile(repeats))
+    for label in sizes:
+        text = randomText(SIZES[label])
+        large = SIZES[label] >= SIZES['16MB']
+        record('cryption.%s' % label, benchCryption(text, standardMachine, 1 if large else repeats))
+        record('cryption.navy.%s' % label, benchCryption(text, navyMachine, 1 if large else repeats))
+        if np is not None and hasattr(core.EnigmaMachine, 'cryptionArray'):
+            record('cryptionArray.%s' % label, benchBulkCryption(text, 1 if large else repeats))
+    if np is not None and hasattr(core, 'MultiKeyEnigma'):
+        record('MultiKeyEnigma.1000keys', benchMultiKey(repeats))
+    if np is not None and hasattr(core.BombeMachine, 'runBombe') and not quick:
+        record('BombeMachine.runBombe', benchBombe(1))
+    return results
+
+def gitCommit(directory):
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True,
+                              cwd=directory).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+# Ratio new/old seconds of every benchmark in both runs, returns the names slower than threshold
+def compareResults(results, baseline, threshold):
+    slower = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        ratio = result['seconds'] / baseline[name]['seconds']
+        print('%-28s %6.2fx' % (name, ratio), file=sys.stderr)
+        if ratio > threshold:
+            slower.append(name)
+    return slower
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the Enigma cipher, stepping and Bombe hot paths')
+    parser.add_argument('-o', '--output', default='benchmark.json', help='JSON file for the results')
+    parser.add_argument('--sizes', nargs='+', choices=list(SIZES), default=['1KB', '64KB', '1MB', '16MB', '100MB'],
+                        help='text sizes for the cryption benchmarks')
+    parser.add_argument('--repeats', type=int, default=5, help='repeats per benchmark, the best is kept')
+    parser.add_argument('--quick', action='store_true', help='skip the Bombe sweep')
+    parser.add_argument('--core', help='engine file of another tree (EnigmaCore.py, or EnigmaSimulation.py of '
+                                       'a tree from before EnigmaCore) instead of this one')
+    parser.add_argument('--compare', help='earlier JSON results to compare against')
+    parser.add_argument('--threshold', type=float, default=1.10, help='slowdown ratio reported as a regression')
+    args = parser.parse_args(argv)
+
+    loadCore(args.core)
+    results = runBenchmarks(args.sizes, args.repeats, args.quick)
+    report = {
+        'meta': {
+            'commit': gitCommit(os.path.dirname(os.path.abspath(core.__file__))),
+            'core': os.path.abspath(core.__file__),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'numpy': np.__version__ if np is not None else None,
+            'seed': SEED,
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            },
+        'results': results,
+        }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+        slower = compareResults(results, baseline, args.threshold)
+        if slower:
+            print('slower than %.2fx: %s' % (args.threshold, ', '.join(slower)), file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
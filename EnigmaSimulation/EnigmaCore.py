@@ -0,0 +1,2407 @@
+# == Enigma Machine and Bombe Decryption ==
+# =     by John Finegan          v 1.0.00 =
+# =                                       =
+# =       University of Cincinnati        =
+# =             Spring 2019               =
+# =========================================
+#
+# Headless core - rotors, enigma machines, the Bombe and the attacks.  No pygame here, so batch jobs
+# and process pool workers can import it without loading a display (the interface is EnigmaSimulation.py)
+
+from collections import deque, namedtuple, OrderedDict
+import functools
+import hashlib
+import heapq
+import json
+import os
+import queue
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+
+# numpy is only needed for the array modes - bulk cryption, the Bombe and the statistical attack - and takes
+# longer to import than the rest of this module, so it is imported on first use.  np stands in for the module
+# until then (the first np.<name> imports it and rebinds np), numpyAvailable() checks for it without importing.
+# np is internal (left out of __all__), other modules get the real module from numpyModule()
+class LazyNumpy:
+
+    def __getattr__(self, name):
+        global np
+        import numpy
+        np = numpy
+        return getattr(numpy, name)
+
+np = LazyNumpy()
+
+@functools.lru_cache(maxsize=None)
+def numpyAvailable():
+    import importlib.util
+    return importlib.util.find_spec('numpy') is not None
+
+# The numpy module, imported now if it was not yet, None without numpy
+def numpyModule():
+    if not numpyAvailable():
+        return None
+    import numpy
+    return numpy
+
+# check out http://enigmaco.de/enigma/enigma.html
+
+alphabet = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+
+# Reflectors
+#   Standard
+reflectorA = 'EJMZALYXVBWFCRQUONTSPIKHGD'
+reflectorB = 'YRUHQSLDPXNGOKMIEBFZCWVJAT'
+reflectorC = 'FVPJIAOYEDRZXWGCTKUQSBNMHL'
+#   Navy
+reflectorBt = 'ENKQAUYWJICOPBLMDXZVFTHRGS'
+reflectorCt = 'RDOBJNTKVEHMLFCWZAXGYIPSUQ'
+
+
+# Immutable wiring of a rotor type - cipherbet and turnover notches
+#   Safe to share between machines, threads and processes.  Each machine builds its own 'rotor' from it
+RotorWiring = namedtuple('RotorWiring', ['cipherbet', 'notches'])
+
+
+# Class for individual rotors.  One instance per machine position, holds the mutable state
+# Includes:
+#   rotorConnections - Cipherbet of the rotor class, static per rotor
+#   currentRotation - rotational location of the rotor, changes as operates
+#   ringSetting - configurable setting of cipherbet in relation to rotation (a fixed rotation)
+#   turnoverNotch - digital representation of when to signal next rotor to rotate
+#   
+#   Initialization, setters for all settings, rotate method, encipherment/decipherment both forward and back,
+#   construction from a RotorWiring and cloning
+#
+class rotor:
+
+    def __init__(self, cipherbet, notches=None):
+        self.currentRotation = 1
+        self.ringSetting = 1
+        self.turnoverNotch = notches
+        self.turnovers = turnoverRotations(self)
+        self.setConnections(cipherbet)
+
+    # New rotor from a RotorWiring, or a copy of the state of an existing rotor
+    @classmethod
+    def fromWiring(cls, wiring):
+        if isinstance(wiring, rotor):
+            return wiring.clone()
+        return cls(wiring.cipherbet, wiring.notches)
+
+    def clone(self):
+        copy = rotor(self.rotorConnections, self.turnoverNotch)
+        copy.currentRotation = self.currentRotation
+        copy.ringSetting = self.ringSetting
+        return copy
+
+    def getWiring(self):
+        return RotorWiring(self.rotorConnections, self.turnoverNotch)
+
+    def setConnections(self, cipherbet):
+        self.rotorConnections = cipherbet
+
+    def setRotate(self, input):
+        self.currentRotation = input
+
+    def setRing(self, input):
+        self.ringSetting = input
+
+    # Turnover is a set lookup of the rotations precomputed from the notches (see turnoverRotations)
+    def rotate(self):
+        if self.currentRotation == 26:
+            self.currentRotation = 1
+        else:
+            self.currentRotation = self.currentRotation + 1
+        return self.currentRotation in self.turnovers
+
+    def validate(self, num):
+        if num <= 0:
+            return 26 + num
+        elif num >= 26:
+            return num - 26
+        else:
+            return num
+    
+    def mapLetter(self, input, direction):
+        num = input
+        num = self.validate(num - self.ringSetting)
+        num = self.validate(num + self.currentRotation)
+        
+        if direction == 2:
+            letter = alphabet[num]
+            num = self.rotorConnections.index(letter)
+        else:
+            letter = self.rotorConnections[num]
+            num = alphabet.index(letter)
+
+        num = self.validate(num - self.currentRotation)
+        num = self.validate(num + self.ringSetting)
+        
+        return num
+
+    def getLetter(self, input):
+        return alphabet[input]
+
+
+# Standard Rotors
+rotor1 = RotorWiring('EKMFLGDQVZNTOWYHXUSPAIBRCJ', 'Q')
+rotor2 = RotorWiring('AJDKSIRUXBLHWTMCQGZNPYFVOE', 'E')
+rotor3 = RotorWiring('BDFHJLCPRTXVZNYEIWGAKMUSQO', 'V')
+rotor4 = RotorWiring('ESOVPZJAYQUIRHXLNFTGKDCMWB', 'J')
+rotor5 = RotorWiring('VZBRGITYUPSDNHLXAWMJQOFECK', 'Z')
+rotor6 = RotorWiring('JPGVOUMFYQBENHZRDKASXLICTW', 'ZM')
+rotor7 = RotorWiring('NZJHGRCXMYSWBOUFAIVLPEKQDT', 'ZM')
+rotor8 = RotorWiring('FKQHTLXOCBJSPDZRAMEWNIUYGV', 'ZM')
+
+# Navy Rotors
+rotorBeta = RotorWiring('LEYJVCNIXWPBQMDRTAKZGFUHOS', None)
+rotorGamma = RotorWiring('FSOKANUERHMBTIYCWLQPZXVGJD', None)
+
+# Rotor choices by number, as used by EnigmaMachine.setRotor
+rotorChoices = {
+    1: rotor1,
+    2: rotor2,
+    3: rotor3,
+    4: rotor4,
+    5: rotor5,
+    6: rotor6,
+    7: rotor7,
+    8: rotor8,
+    9: None,
+    10: rotorBeta,
+    11: rotorGamma
+    }
+
+reflectorList = [reflectorA, reflectorB, reflectorC, reflectorBt, reflectorCt]
+
+# Plugboards
+#   A plugboard is a 26 entry involution of letter numbers - plugboard[letter] is its partner, an unplugged
+#   letter is its own partner.  Machines keep it as a bytearray: it indexes like a list, bytes() of it is a
+#   hashable key and numpy reads it without a copy.  Sets of letters are int bitmasks, bit i for letter i
+PLUGBOARD_CABLES = 10
+IDENTITY_PLUGBOARD = bytes(range(26))
+
+# Plug the pairs of a setPlugboard string ("AB CD") into plugboard, skipping pairs with a letter already
+# plugged or that are not two letters, until the board holds maxPairs pairs
+def plugPairs(plugboard, plugboardString, maxPairs=13):
+    pairs = plugboardPairs(plugboard)
+    for pair in plugboardString.split(' '):
+        if pairs >= maxPairs:
+            break
+        if len(pair) != 2 or pair[0] not in alphabet or pair[1] not in alphabet or pair[0] == pair[1]:
+            continue
+        a, b = ord(pair[0]) - 65, ord(pair[1]) - 65
+        if plugboard[a] == a and plugboard[b] == b:
+            plugboard[a], plugboard[b] = b, a
+            pairs += 1
+    return plugboard
+
+def parsePlugboard(plugboardString, maxPairs=13):
+    return plugPairs(bytearray(IDENTITY_PLUGBOARD), plugboardString, maxPairs)
+
+def plugboardString(plugboard):
+    return ' '.join(alphabet[a] + alphabet[int(b)] for a, b in enumerate(plugboard) if a < b)
+
+# Plugboard as a numpy letter number array, for fancy indexing in the array attacks
+def plugboardArray(plugboardString):
+    return np.frombuffer(bytes(parsePlugboard(plugboardString)), dtype=np.uint8).astype(np.intp)
+
+def isPlugboard(plugboard):
+    return len(plugboard) == 26 and all(0 <= plugboard[a] < 26 and plugboard[plugboard[a]] == a for a in range(26))
+
+# Bitmask of the plugged letters
+def plugboardMask(plugboard):
+    mask = 0
+    for a in range(26):
+        if plugboard[a] != a:
+            mask |= 1 << a
+    return mask
+
+def plugboardPairs(plugboard):
+    return bin(plugboardMask(plugboard)).count('1') // 2
+
+def maskLetters(mask):
+    return ''.join(alphabet[a] for a in range(26) if mask >> a & 1)
+
+# plugboard -> permutation -> plugboard as one 26 entry permutation, e.g. a scrambler wrapped in its plugboard
+def composePlugboard(plugboard, permutation):
+    return bytes(plugboard[permutation[plugboard[a]]] for a in range(26))
+
+# Hill-climb move on a plugboard array: unplug a/b if plugged together, else plug them, freeing old partners
+def togglePair(plugboard, a, b):
+    if plugboard[a] == b:
+        plugboard[a], plugboard[b] = a, b
+        return
+    for letter in (a, b):
+        partner = plugboard[letter]
+        plugboard[partner] = partner
+        plugboard[letter] = letter
+    plugboard[a], plugboard[b] = b, a
+
+# Number of plugboards with exactly pairs pairs out of letters free letters - letters! / ((letters - 2 pairs)! pairs! 2**pairs)
+def plugboardCount(pairs, letters=26):
+    count = 1
+    for k in range(pairs):
+        count = count * (letters - 2 * k) * (letters - 2 * k - 1) // 2
+    for k in range(2, pairs + 1):
+        count //= k
+    return count
+
+# Every plugboard with exactly pairs pairs, leaving the letters of the plugged bitmask alone.  One bytearray is
+# rewired in place and yielded each time, copy it (bytes()) to keep it
+def plugboardConfigurations(pairs, plugged=0):
+    plugboard = bytearray(IDENTITY_PLUGBOARD)
+    free = [a for a in range(26) if not plugged >> a & 1]
+
+    # pairs are placed in order of their lower letter, so each plugboard comes up once
+    def place(start, used, remaining):
+        if remaining == 0:
+            yield plugboard
+            return
+        for i in range(start, len(free) - 1):
+            if len(free) - i < 2 * remaining:
+                break
+            a = free[i]
+            if used >> a & 1:
+                continue
+            for b in free[i + 1:]:
+                if used >> b & 1:
+                    continue
+                plugboard[a], plugboard[b] = b, a
+                yield from place(i + 1, used | 1 << a | 1 << b, remaining - 1)
+                plugboard[a], plugboard[b] = a, b
+
+    if 0 <= pairs and 2 * pairs <= len(free):
+        yield from place(0, 0, pairs)
+
+# count (endless if None) random plugboards with pairs pairs, reproducible with seed.  Reuses one bytearray like
+# plugboardConfigurations
+def randomPlugboards(pairs, count=None, seed=None, plugged=0):
+    generator = random.Random(seed)
+    free = [a for a in range(26) if not plugged >> a & 1]
+    if 2 * pairs > len(free):
+        raise ValueError('%d pairs do not fit in %d free letters' % (pairs, len(free)))
+    plugboard = bytearray(IDENTITY_PLUGBOARD)
+    sampled = 0
+    while count is None or sampled < count:
+        plugboard[:] = IDENTITY_PLUGBOARD
+        letters = generator.sample(free, 2 * pairs)
+        for k in range(0, 2 * pairs, 2):
+            a, b = letters[k], letters[k + 1]
+            plugboard[a], plugboard[b] = b, a
+        sampled += 1
+        yield plugboard
+
+# Class for enigma machines
+# Includes:
+#   Rotors - 3 objects of the 'rotor' class, can be configured
+#               Built per machine from RotorWiring (or copied from a rotor), never shared with other machines
+#               Navy Rotor is optional, defaults to None, does not rotate (by design!)
+#   Reflector - current reflector cipherbet used, can be configured
+#   Plugboard - 26 entry involution bytearray of letter numbers, see Plugboards above
+#   
+#   Initialization, setters for all settings of enigma machine and individual rotors,
+#   encryption/decryption operation letter by letter, cloning
+#
+class EnigmaMachine:
+    
+    def __init__(self, RR = rotor1, MR = rotor2, LR = rotor3, RF = reflectorA, NR = None, PB = None):
+        if NR is not None:
+            self.NavyRotor = rotor.fromWiring(NR)
+        else:
+            self.NavyRotor = None
+        
+        self.plugboard = bytearray(IDENTITY_PLUGBOARD)
+        if PB is not None:
+           self.setPlugboard(PB)
+
+        self.RightRotor = rotor.fromWiring(RR)
+        self.MiddleRotor = rotor.fromWiring(MR)
+        self.LeftRotor = rotor.fromWiring(LR)
+        self.MachineReflector = RF
+        self.compiledEngine = None
+        self.setRotorRotation([26,1,1])
+
+    # Independent copy with the same settings and rotor positions
+    #   The compiled engine only holds immutable tables, so the copy shares it
+    def clone(self):
+        copy = EnigmaMachine.__new__(EnigmaMachine)
+        copy.NavyRotor = self.NavyRotor.clone() if self.NavyRotor is not None else None
+        copy.plugboard = bytearray(self.plugboard)
+        copy.RightRotor = self.RightRotor.clone()
+        copy.MiddleRotor = self.MiddleRotor.clone()
+        copy.LeftRotor = self.LeftRotor.clone()
+        copy.MachineReflector = self.MachineReflector
+        copy.compiledEngine = self.compiledEngine
+        return copy
+
+    def setRotor(self, position, choice):
+        switchRotor = rotorChoices
+        switchPosition = {
+            1: 'Left',
+            2: 'Middle',
+            3: 'Right',
+            4: 'Navy'
+            }
+        if switchPosition.get(position) == 'Left':
+            self.LeftRotor = self.replaceRotor(self.LeftRotor, switchRotor.get(choice))
+        elif switchPosition.get(position) == 'Middle':
+            self.MiddleRotor = self.replaceRotor(self.MiddleRotor, switchRotor.get(choice))
+        elif switchPosition.get(position) == 'Right':
+            self.RightRotor = self.replaceRotor(self.RightRotor, switchRotor.get(choice))
+        elif switchPosition.get(position) == 'Navy':
+            self.NavyRotor = self.replaceRotor(self.NavyRotor, switchRotor.get(choice))
+
+    # New rotor of the chosen wiring for this machine, keeping the ring setting and rotation of the old one
+    def replaceRotor(self, current, wiring):
+        if wiring is None:
+            return None
+        new = rotor.fromWiring(wiring)
+        if current is not None:
+            new.setRing(current.ringSetting)
+            new.setRotate(current.currentRotation)
+        return new
+
+    def setReflector(self, input):
+        self.MachineReflector = input
+        
+
+    def setRotorRotation(self, rotSettings):
+        self.RightRotor.setRotate(rotSettings[0])
+        self.MiddleRotor.setRotate(rotSettings[1])
+        self.LeftRotor.setRotate(rotSettings[2])
+
+    def setRingSetting(self, rinSettings):
+        self.RightRotor.setRing(rinSettings[0])
+        self.MiddleRotor.setRing(rinSettings[1])
+        self.LeftRotor.setRing(rinSettings[2])
+
+    # Ring setting of the navy rotor, ignored without one
+    def setNavyRingSetting(self, ring):
+        if self.NavyRotor is not None:
+            self.NavyRotor.setRing(ring)
+
+
+    # Add the pairs of a string like "AB CD", up to PLUGBOARD_CABLES pairs on the board.  '' unplugs everything
+    def setPlugboard(self, plugboardString):
+        if plugboardString == '':
+            self.plugboard = bytearray(IDENTITY_PLUGBOARD)
+        else:
+            plugPairs(self.plugboard, plugboardString, PLUGBOARD_CABLES)
+
+    # Replace the plugboard with a 26 entry involution, e.g. one from plugboardConfigurations
+    def setPlugboardArray(self, plugboard):
+        if not isPlugboard(plugboard):
+            raise ValueError('plugboard must be a 26 entry involution of letter numbers')
+        self.plugboard = bytearray(plugboard)
+
+    # Input text to be encrypted/decrypted.  Rotate after each letter
+    #   Runs on the compiled lookup-table engine, rotor positions are written back after the text
+    def cryption(self, inputText):
+        engine = self.compile()
+        cipheredText, rotations = engine.cryption(inputText, self.getRotorRotation())
+        self.setRotorRotation(rotations)
+        return cipheredText
+
+    # cryption on a process pool - the text is cut into chunks, each chunk starts from the rotations seek gives
+    # for the letters before it (spaces do not step), and the ciphered chunks are joined back in order
+    def parallelCryption(self, inputText, workers=None, chunkSize=1 << 20):
+        engine = self.compile()
+        rotations = self.getRotorRotation()
+        if len(inputText) <= chunkSize or workers == 1:
+            return self.cryption(inputText)
+
+        chunks = [inputText[i : i + chunkSize] for i in range(0, len(inputText), chunkSize)]
+        starts = []
+        letters = 0
+        for chunk in chunks:
+            starts.append(engine.seek(rotations, letters))
+            letters += len(chunk) - chunk.count(' ')
+
+        import concurrent.futures
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=cryptionWorkerInit,
+                                                    initargs=(engine,)) as executor:
+            cipheredText = ''.join(executor.map(cryptionChunk, chunks, starts))
+        self.setRotorRotation(engine.seek(rotations, letters))
+        return cipheredText
+
+    # Incremental encoder carrying the rotor state across chunks, see EnigmaStream
+    def stream(self):
+        return EnigmaStream(self)
+
+    # Bulk encryption/decryption of a uint8 array of letter numbers (0-25, no spaces) - needs numpy
+    def cryptionArray(self, letters):
+        engine = self.compile()
+        ciphered, rotations = engine.cryptionArray(letters, self.getRotorRotation())
+        self.setRotorRotation(rotations)
+        return ciphered
+
+    # Bulk mode for plain text - capital letters are enciphered as an array, spaces pass through
+    def bulkCryption(self, inputText):
+        if not numpyAvailable():
+            raise ImportError('bulk cryption requires numpy')
+        text = np.frombuffer(inputText.encode('ascii'), dtype=np.uint8)
+        letters = text != ord(' ')
+        if ((text[letters] < ord('A')) | (text[letters] > ord('Z'))).any():
+            raise ValueError('bulk cryption only accepts capital letters and spaces')
+        ciphered = text.copy()
+        ciphered[letters] = self.cryptionArray(text[letters] - ord('A')) + ord('A')
+        return ciphered.tobytes().decode('ascii')
+
+    # Move the rotors on by count keypresses in one jump (spaces are not keypresses)
+    def seek(self, count):
+        self.setRotorRotation(self.compile().seek(self.getRotorRotation(), count))
+
+    def getRotorRotation(self):
+        return [self.RightRotor.currentRotation, self.MiddleRotor.currentRotation, self.LeftRotor.currentRotation]
+
+    # Everything the compiled tables depend on (rotor positions excluded, they are passed per call)
+    def configurationKey(self):
+        navy = None
+        if self.NavyRotor is not None:
+            navy = (self.NavyRotor.rotorConnections, self.NavyRotor.ringSetting, self.NavyRotor.currentRotation)
+        return (self.RightRotor.rotorConnections, self.RightRotor.turnoverNotch, self.RightRotor.ringSetting,
+                self.MiddleRotor.rotorConnections, self.MiddleRotor.turnoverNotch, self.MiddleRotor.ringSetting,
+                self.LeftRotor.rotorConnections, self.LeftRotor.turnoverNotch, self.LeftRotor.ringSetting,
+                navy, self.MachineReflector, bytes(self.plugboard))
+
+    # Compiled engine for the current settings - looked up in keySchedule only when a setting has changed
+    def compile(self):
+        key = self.configurationKey()
+        if self.compiledEngine is None or self.compiledEngine.key != key:
+            self.compiledEngine = keySchedule.engine(key, lambda: CompiledEnigma(self, key))
+        return self.compiledEngine
+
+    # Machine for a key - rotors (left, middle, right) as numbered in setRotor, ringSetting and rotorRotation
+    # [right, middle, left], plugboard as a setPlugboard string.  A key seen before reuses its compiled tables on compile
+    @classmethod
+    def fromKey(cls, rotors, ringSetting=(1, 1, 1), reflector=reflectorB, plugboard='', navyRotor=None,
+                rotorRotation=(1, 1, 1)):
+        left, middle, right = rotors
+        machine = cls(rotorChoices[right], rotorChoices[middle], rotorChoices[left], reflector,
+                      rotorChoices[navyRotor] if navyRotor is not None else None, plugboard)
+        machine.setRingSetting(list(ringSetting))
+        machine.setRotorRotation(list(rotorRotation))
+        return machine
+
+    # Rotate rotors 1 machine state - Notches implemented as true checks in rotor class...double stepping implemented
+    def rotateRotors(self):
+        if self.RightRotor.rotate():
+            if self.MiddleRotor.rotate():
+                self.LeftRotor.rotate()
+                self.MiddleRotor.rotate()
+
+    # Letter by letter encryption/decryption        
+    def cipher(self, letter):
+        #Plugboard Character Swap Forward
+        ciphered = self.plugboardSwap(letter)
+
+        #Forward cipherment - R -> M -> L
+        ciphered = self.RightRotor.mapLetter(alphabet.index(ciphered), 1) 
+        ciphered = self.MiddleRotor.mapLetter(ciphered, 1)
+        ciphered = self.LeftRotor.mapLetter(ciphered, 1)
+
+        #reflector, with the static navy rotor folded in
+        ciphered = self.reflectorTable()[ciphered]
+        
+        #Backward cipherment - L -> M -> R
+        ciphered = self.LeftRotor.mapLetter(ciphered, 2)
+        ciphered = self.MiddleRotor.mapLetter(ciphered, 2)
+        ciphered = self.RightRotor.mapLetter(ciphered, 2)
+        
+        ciphered = alphabet[ciphered]
+
+        #Plugboard Character Swap Backward
+        ciphered = self.plugboardSwap(ciphered)
+
+        return ciphered
+
+    # Reflector as letter numbers with the navy rotor, if any, folded in at its ring setting and rotation
+    def reflectorTable(self):
+        navy = self.NavyRotor
+        if navy is None:
+            return foldedReflector(self.MachineReflector)
+        return foldedReflector(self.MachineReflector, navy.rotorConnections, navy.ringSetting, navy.currentRotation)
+
+    def decryption(self, inputText):
+        return self.cryption(text)
+ 
+    def plugboardSwap(self, letter):
+        if len(letter) == 1 and letter in alphabet:
+            return alphabet[self.plugboard[ord(letter) - 65]]
+        else:
+            return letter
+
+# Forward and backward integer tables of a rotor for every rotation 0-26 at a fixed ring setting
+#   forward[rotation][num] is rotor.mapLetter(num, 1), backward[rotation][num] is rotor.mapLetter(num, 2)
+def rotorTables(wheel, ring):
+    wiring = [alphabet.index(letter) for letter in wheel.rotorConnections]
+    inverse = [wiring.index(num) for num in range(26)]
+    forward = []
+    backward = []
+    for rotation in range(27):
+        forward.append([(wiring[(num - ring + rotation) % 26] - rotation + ring) % 26 for num in range(26)])
+        backward.append([(inverse[(num - ring + rotation) % 26] - rotation + ring) % 26 for num in range(26)])
+    return forward, backward
+
+# Reflector as a tuple of letter numbers, with a navy rotor of the given wiring, ring and rotation on its
+# way in and out.  The navy rotor does not step, so an M4 machine is a three rotor machine with this reflector
+#   Only rotation - ring matters, so one table per navy offset covers every ring setting
+@functools.lru_cache(maxsize=1024)
+def foldedReflector(reflector, navyConnections=None, navyRing=1, navyRotation=1):
+    table = [alphabet.index(letter) for letter in reflector]
+    if navyConnections is None:
+        return tuple(table)
+    wiring = [alphabet.index(letter) for letter in navyConnections]
+    inverse = [wiring.index(num) for num in range(26)]
+    offset = navyRotation - navyRing
+    forward = [(wiring[(num + offset) % 26] - offset) % 26 for num in range(26)]
+    backward = [(inverse[(num + offset) % 26] - offset) % 26 for num in range(26)]
+    return tuple(backward[table[forward[num]]] for num in range(26))
+
+# Rotations at which stepping onto them signals the next rotor
+#   A notch signals when (rotation - 1) == notch letter number + 1, a rotor without notches signals on 26
+def turnoverRotations(wheel):
+    if wheel.turnoverNotch is not None:
+        return frozenset(alphabet.index(notch) + 2 for notch in wheel.turnoverNotch)
+    return frozenset([26])
+
+# Letter numbers for the array modes as a uint8 array - anything outside 0..25 is refused before the cast,
+# which would wrap it silently onto another letter
+def letterArray(letters):
+    letters = np.asarray(letters)
+    if letters.size and (letters.dtype.kind not in 'iub' or letters.min() < 0 or letters.max() >= 26):
+        raise ValueError('letter numbers must be integers 0-25')
+    return letters.astype(np.uint8, copy=False)
+
+# Class for the compiled cipher engine
+# Includes:
+#   key - configuration of the enigma the tables were built from
+#   plugboard - plugboard involution of the machine
+#   inputIndex - character -> letter number after the forward plugboard swap
+#   outputLetter - letter number -> character after the backward plugboard swap
+#   rightForward/rightBackward - right rotor tables per rotation
+#   coreTables - middle rotor, left rotor, navy rotor and reflector folded into one table per (middle, left) rotation
+#   scramblerKey - everything the scrambler (no plugboard, no turnovers) depends on, names its ScramblerCache file
+#
+#   Tables are built once per configuration, each letter is then 4 list lookups instead of 8 mapLetter calls
+#
+class CompiledEnigma:
+
+    def __init__(self, enigma, key=None):
+        self.key = key if key is not None else enigma.configurationKey()
+
+        self.plugboard = bytes(enigma.plugboard)
+        self.inputIndex = {letter: self.plugboard[num] for num, letter in enumerate(alphabet)}
+        self.outputLetter = [alphabet[num] for num in self.plugboard]
+
+        self.rightForward, self.rightBackward = rotorTables(enigma.RightRotor, enigma.RightRotor.ringSetting)
+        self.middleForward, self.middleBackward = rotorTables(enigma.MiddleRotor, enigma.MiddleRotor.ringSetting)
+        self.leftForward, self.leftBackward = rotorTables(enigma.LeftRotor, enigma.LeftRotor.ringSetting)
+
+        self.rightTurnover = turnoverRotations(enigma.RightRotor)
+        self.middleTurnover = turnoverRotations(enigma.MiddleRotor)
+        self.leftTurnover = turnoverRotations(enigma.LeftRotor)
+
+        # The navy rotor never rotates, so it folds into the reflector
+        reflector = list(enigma.reflectorTable())
+        self.reflector = reflector
+        self.scramblerKey = (enigma.RightRotor.rotorConnections, enigma.RightRotor.ringSetting,
+                             enigma.MiddleRotor.rotorConnections, enigma.MiddleRotor.ringSetting,
+                             enigma.LeftRotor.rotorConnections, enigma.LeftRotor.ringSetting, tuple(reflector))
+
+        self.coreTables = {}
+        self.coreFull = None
+        self.fullTable = None
+        self.nextState = None
+        self.turnoverSequences = {}
+
+    def coreTable(self, middle, left):
+        table = self.coreTables.get((middle, left))
+        if table is None:
+            mf, mb = self.middleForward[middle], self.middleBackward[middle]
+            lf, lb = self.leftForward[left], self.leftBackward[left]
+            reflector = self.reflector
+            table = [mb[lb[reflector[lf[mf[num]]]]] for num in range(26)]
+            self.coreTables[(middle, left)] = table
+        return table
+
+    # Same stepping as EnigmaMachine.rotateRotors on plain rotation numbers
+    def step(self, rotations):
+        right, middle, left = rotations
+        right = 1 if right == 26 else right + 1
+        if right in self.rightTurnover:
+            middle = 1 if middle == 26 else middle + 1
+            if middle in self.middleTurnover:
+                left = 1 if left == 26 else left + 1
+                middle = 1 if middle == 26 else middle + 1
+        return [right, middle, left]
+
+    # Encrypt/decrypt text starting from rotations [right, middle, left]
+    #   Returns the ciphered text and the rotations after the last letter, spaces pass through without rotating
+    def cryption(self, inputText, rotations):
+        right, middle, left = rotations
+        rightForward = self.rightForward
+        rightBackward = self.rightBackward
+        rightTurnover = self.rightTurnover
+        middleTurnover = self.middleTurnover
+        inputIndex = self.inputIndex
+        outputLetter = self.outputLetter
+        core = self.coreTable(middle, left)
+
+        cipheredText = []
+        append = cipheredText.append
+        turnovers = 0
+        doubleSteps = 0
+        for letter in inputText:
+            if letter == ' ':
+                append(letter)
+                continue
+            right = 1 if right == 26 else right + 1
+            if right in rightTurnover:
+                turnovers += 1
+                middle = 1 if middle == 26 else middle + 1
+                if middle in middleTurnover:
+                    doubleSteps += 1
+                    left = 1 if left == 26 else left + 1
+                    middle = 1 if middle == 26 else middle + 1
+                core = self.coreTable(middle, left)
+            num = inputIndex.get(letter)
+            if num is None:
+                raise ValueError('%r cannot be enciphered' % letter)
+            append(outputLetter[rightBackward[right][core[rightForward[right][num]]]])
+        if metrics is not None:
+            letters = len(cipheredText) - inputText.count(' ')
+            metrics.count(letters=letters, rotorSteps=letters + turnovers + 2 * doubleSteps, doubleSteps=doubleSteps)
+        return ''.join(cipheredText), [right, middle, left]
+
+    # Whole path plugboard -> rotors -> reflector -> rotors -> plugboard as one numpy table
+    #   indexed [left, middle, right, letter], built with broadcast gathers once per configuration
+    def stateArray(self):
+        if self.fullTable is None:
+            if self.plugboard == IDENTITY_PLUGBOARD:
+                self.fullTable = self.coreArray()
+            else:
+                self.fullTable = self.plugboardTable(self.plugboard)
+        return self.fullTable
+
+    # stateArray without the plugboard - rotors -> reflector -> rotors for every state
+    #   Mapped from the installed ScramblerCache when there is one, built here otherwise
+    def coreArray(self):
+        if self.coreFull is None:
+            if scramblerCache is not None:
+                self.coreFull = scramblerCache.table(self)
+            else:
+                self.coreFull = self.buildCoreArray()
+        return self.coreFull
+
+    def buildCoreArray(self):
+        rotation = np.arange(27)
+        r = rotation[None, None, :, None]
+        m = rotation[None, :, None, None]
+        l = rotation[:, None, None, None]
+
+        num = np.arange(26)[None, None, None, :]
+        num = np.array(self.rightForward)[r, num]
+        num = np.array(self.middleForward)[m, num]
+        num = np.array(self.leftForward)[l, num]
+        num = np.array(self.reflector)[num]
+        num = np.array(self.leftBackward)[l, num]
+        num = np.array(self.middleBackward)[m, num]
+        num = np.array(self.rightBackward)[r, num]
+        return num.astype(np.uint8).ravel()
+
+    # stateArray for any other plugboard - the core table wrapped in the plugboard on both sides
+    def plugboardTable(self, plugboard):
+        plugboard = np.frombuffer(bytes(plugboard), dtype=np.uint8)
+        return plugboard[self.coreArray().reshape(-1, 26)[:, plugboard]].ravel()
+
+    # (middle, left) rotations after each right rotor turnover from a start, with where the sequence starts to cycle
+    #   The pair only changes on right turnovers and has 26*26 states, so the sequence repeats within 677 entries
+    def turnoverSequence(self, middle, left):
+        cached = self.turnoverSequences.get((middle, left))
+        if cached is not None:
+            return cached
+        sequence = [(middle, left)]
+        seen = {(middle, left): 0}
+        while True:
+            middle = 1 if middle == 26 else middle + 1
+            if middle in self.middleTurnover:
+                left = 1 if left == 26 else left + 1
+                middle = 1 if middle == 26 else middle + 1
+            if (middle, left) in seen:
+                break
+            seen[(middle, left)] = len(sequence)
+            sequence.append((middle, left))
+        cached = (sequence, seen[(middle, left)])
+        self.turnoverSequences[sequence[0]] = cached
+        return cached
+
+    # Number of right rotor turnovers in the next count keypresses from a right rotation
+    def rightTurnovers(self, right, count):
+        turnovers = 0
+        for rotation in self.rightTurnover:
+            first = (rotation - right) % 26 or 26
+            if rotation <= 26 and first <= count:
+                turnovers += (count - first) // 26 + 1
+        return turnovers
+
+    # Rotations [right, middle, left] after count keypresses, without stepping through them
+    def seek(self, rotations, count):
+        right, middle, left = rotations
+        turnovers = self.rightTurnovers(right, count)
+        sequence, cycleStart = self.turnoverSequence(middle, left)
+        if turnovers >= len(sequence):
+            turnovers = cycleStart + (turnovers - cycleStart) % (len(sequence) - cycleStart)
+        middle, left = sequence[turnovers]
+        return [(right - 1 + count) % 26 + 1, middle, left]
+
+    # Rotations of every letter of an n letter message, computed up front
+    #   The right rotor is a plain count, the (middle, left) pair is looked up from its turnover sequence
+    def rotationArrays(self, rotations, length):
+        right, middle, left = rotations
+        rights = (right - 1 + np.arange(1, length + 1, dtype=np.int32)) % 26 + 1
+        turnoverMask = np.zeros(27, dtype=bool)
+        turnoverMask[[rotation for rotation in self.rightTurnover if rotation <= 26]] = True
+        turnovers = np.cumsum(turnoverMask[rights], dtype=np.int32)
+
+        sequence, cycleStart = self.turnoverSequence(middle, left)
+        cycleLength = len(sequence) - cycleStart
+        states = np.array(sequence, dtype=np.int32)
+        events = np.where(turnovers < len(sequence), turnovers, cycleStart + (turnovers - cycleStart) % cycleLength)
+        return rights, states[events, 0], states[events, 1]
+
+    # Next machine state for every state, states coded (left * 27 + middle) * 27 + right like stateArray
+    def stepArray(self):
+        if self.nextState is None:
+            rotation = np.arange(27)
+            right = rotation[None, None, :]
+            middle = rotation[None, :, None]
+            left = rotation[:, None, None]
+            rightMask = np.zeros(28, dtype=bool)
+            rightMask[[rotation for rotation in self.rightTurnover if rotation <= 27]] = True
+            middleMask = np.zeros(28, dtype=bool)
+            middleMask[[rotation for rotation in self.middleTurnover if rotation <= 27]] = True
+
+            right = np.broadcast_to(right % 26 + 1, (27, 27, 27))
+            turnover = rightMask[right]
+            middle = np.where(turnover, middle % 26 + 1, middle)
+            doubleStep = turnover & middleMask[middle]
+            left = np.where(doubleStep, left % 26 + 1, left)
+            middle = np.where(doubleStep, middle % 26 + 1, middle)
+            self.nextState = ((left * 27 + middle) * 27 + right).ravel()
+        return self.nextState
+
+    # Array version of cryption - letters is a uint8 array of letter numbers, processed in blocks
+    def cryptionArray(self, letters, rotations, blockSize=1 << 18):
+        if not numpyAvailable():
+            raise ImportError('array cryption requires numpy')
+        letters = letterArray(letters)
+        table = self.stateArray()
+        ciphered = np.empty_like(letters)
+        rotations = list(rotations)
+        for start in range(0, letters.size, blockSize):
+            block = letters[start : start + blockSize]
+            rights, middles, lefts = self.rotationArrays(rotations, block.size)
+            index = ((lefts * 27 + middles) * 27 + rights) * 26 + block
+            ciphered[start : start + blockSize] = table[index]
+            if metrics is not None:
+                turnovers = int(np.count_nonzero(np.diff(middles, prepend=rotations[1])))
+                doubleSteps = int(np.count_nonzero(np.diff(lefts, prepend=rotations[2])))
+                metrics.count(letters=block.size, rotorSteps=block.size + turnovers + 2 * doubleSteps, doubleSteps=doubleSteps)
+            rotations = [int(rights[-1]), int(middles[-1]), int(lefts[-1])]
+        return ciphered, rotations
+
+# Key of one message for MultiKeyEnigma - fields as in BombeStop/AttackCandidate, so stops and candidates
+# can be passed as keys directly
+#   rotorOrder - (left, middle, right) rotor choices, ringSetting and rotation [right, middle, left]
+#   plugboard - setPlugboard string or 26 entry involution, navy - (navy rotor choice, rotation) or None
+EnigmaKey = namedtuple('EnigmaKey', ['rotorOrder', 'reflector', 'ringSetting', 'rotation', 'plugboard', 'navy'],
+                       defaults=((1, 1, 1), (1, 1, 1), '', None))
+
+# Class for enciphering one text under many keys at once
+# Includes:
+#   keys - the K keys, anything with EnigmaKey's fields (navy optional)
+#   forward/backward - flat rotor tables of every distinct (rotor, ring), 27 x 26 entries each
+#   wheelBase - 3 x K offsets of each key's right, middle and left rotor tables in forward/backward
+#   reflector/plugboard - flat K x 26 reflectors (navy rotor folded in) and plugboards
+#   turnoverMask - flat tables of 28 entries per (rotor, ring), true at the turnover rotations
+#   start - [right, middle, left] start rotations of every key
+#
+#   The K machines advance together, one vectorized step per letter, and every table lookup is a gather
+#   over a whole block of K x letters.  Rotor tables are built once per (rotor, ring) whatever K is
+#
+class MultiKeyEnigma:
+
+    def __init__(self, keys):
+        if not numpyAvailable():
+            raise ImportError('multi key cryption requires numpy')
+        self.keys = list(keys)
+        count = len(self.keys)
+        wheels = {}
+        forward, backward, turnoverMask = [], [], []
+        wheelIndex = np.empty((3, count), dtype=np.intp)
+        reflectors, plugboards = [], []
+        self.start = np.empty((3, count), dtype=np.intp)
+
+        for k, key in enumerate(self.keys):
+            left, middle, right = key.rotorOrder
+            for position, (choice, ring) in enumerate(zip((right, middle, left), key.ringSetting)):
+                index = wheels.get((choice, ring))
+                if index is None:
+                    wheel = rotor.fromWiring(rotorChoices[choice])
+                    wheelForward, wheelBackward = rotorTables(wheel, ring)
+                    forward.append(wheelForward)
+                    backward.append(wheelBackward)
+                    turnovers = turnoverRotations(wheel)
+                    turnoverMask.append([rotation in turnovers for rotation in range(28)])
+                    index = wheels[(choice, ring)] = len(forward) - 1
+                wheelIndex[position, k] = index
+            navy = getattr(key, 'navy', None)
+            if navy is None:
+                reflectors.append(foldedReflector(key.reflector))
+            else:
+                reflectors.append(foldedReflector(key.reflector, rotorChoices[navy[0]].cipherbet, 1, navy[1]))
+            plugboard = key.plugboard
+            plugboards.append(bytes(parsePlugboard(plugboard) if isinstance(plugboard, str) else bytearray(plugboard)))
+            self.start[:, k] = key.rotation
+
+        self.forward = np.array(forward, dtype=np.uint8).ravel()
+        self.backward = np.array(backward, dtype=np.uint8).ravel()
+        self.turnoverMask = np.array(turnoverMask, dtype=bool).ravel()
+        self.wheelBase = wheelIndex * (27 * 26)
+        self.maskBase = wheelIndex[:2] * 28
+        self.reflector = np.array(reflectors, dtype=np.uint8).ravel()
+        self.plugboard = np.frombuffer(b''.join(plugboards), dtype=np.uint8)
+        self.keyBase = np.arange(count) * 26
+
+    # Rotations of every key for the next length letters, each a length x K array, from rotations [right, middle, left]
+    def rotationArrays(self, rotations, length):
+        right, middle, left = rotations
+        rightMask, middleMask = self.maskBase
+        mask = self.turnoverMask
+        rights = np.empty((length, len(self.keys)), dtype=np.intp)
+        middles = np.empty_like(rights)
+        lefts = np.empty_like(rights)
+        for i in range(length):
+            right = right % 26 + 1
+            turnover = mask[rightMask + right]
+            middle = np.where(turnover, middle % 26 + 1, middle)
+            doubleStep = turnover & mask[middleMask + middle]
+            left = np.where(doubleStep, left % 26 + 1, left)
+            middle = np.where(doubleStep, middle % 26 + 1, middle)
+            rights[i], middles[i], lefts[i] = right, middle, left
+        return rights, middles, lefts
+
+    # letters (uint8 letter numbers 0-25) under every key - a K x N uint8 array of letter numbers
+    #   Letters are processed in blocks so the block x K index arrays stay around blockSize entries
+    def cryptionArray(self, letters, blockSize=1 << 22):
+        letters = letterArray(letters)
+        count = len(self.keys)
+        ciphered = np.empty((count, letters.size), dtype=np.uint8)
+        rightBase, middleBase, leftBase = self.wheelBase
+        keyBase = self.keyBase
+        rotations = list(self.start)
+        step = max(1, blockSize // max(count, 1))
+        for start in range(0, letters.size, step):
+            block = letters[start : start + step]
+            rights, middles, lefts = self.rotationArrays(rotations, block.size)
+            rotations = [rights[-1], middles[-1], lefts[-1]]
+            rights = rights * 26 + rightBase
+            middles = middles * 26 + middleBase
+            lefts = lefts * 26 + leftBase
+            num = self.plugboard[keyBase + block[:, None]]
+            num = self.forward[rights + num]
+            num = self.forward[middles + num]
+            num = self.forward[lefts + num]
+            num = self.reflector[keyBase + num]
+            num = self.backward[lefts + num]
+            num = self.backward[middles + num]
+            num = self.backward[rights + num]
+            ciphered[:, start : start + block.size] = self.plugboard[keyBase + num].T
+        return ciphered
+
+    # Plain text under every key - capital letters are enciphered, spaces pass through.  Returns K strings
+    def cryption(self, inputText):
+        text = np.frombuffer(inputText.encode('ascii'), dtype=np.uint8)
+        letters = text != ord(' ')
+        if ((text[letters] < ord('A')) | (text[letters] > ord('Z'))).any():
+            raise ValueError('multi key cryption only accepts capital letters and spaces')
+        ciphered = np.tile(text, (len(self.keys), 1))
+        ciphered[:, letters] = self.cryptionArray(text[letters] - ord('A')) + ord('A')
+        return [row.tobytes().decode('ascii') for row in ciphered]
+
+# Crib position scanning
+#   Each letter of the encrypted text gets a bitmask of the positions where it occurs (bit i = letter i).
+#   A crib cannot sit at offset p if crib letter i equals encrypted letter p + i, so the blocked offsets of a crib
+#   are the union of its letters' masks shifted down by i - one shift and one or per crib letter, whatever
+#   the length of the text.  The masks are built once and shared by every crib scanned against that text
+def letterMasks(encryptedText):
+    text = encryptedText.replace(' ', '').upper().encode('ascii')
+    masks = {}
+    if numpyAvailable():
+        letters = np.frombuffer(text, dtype=np.uint8)
+        for letter in alphabet:
+            packed = np.packbits(letters == ord(letter), bitorder='little')
+            masks[letter] = int.from_bytes(packed.tobytes(), 'little')
+        return masks, len(text)
+    for letter in alphabet:
+        table = bytearray(b'0' * 256)
+        table[ord(letter)] = ord('1')
+        bits = text.translate(bytes(table))[::-1]
+        masks[letter] = int(bits, 2) if bits else 0
+    return masks, len(text)
+
+# Bitmask of the valid offsets of a crib, bit p set when the crib can sit at offset p
+def cribMask(crib, masks, length):
+    crib = crib.replace(' ', '').upper()
+    if len(crib) > length:
+        return 0
+    blocked = 0
+    for i, letter in enumerate(crib):
+        blocked |= masks.get(letter, 0) >> i
+    return ~blocked & ((1 << (length - len(crib) + 1)) - 1)
+
+def bitPositions(mask):
+    if numpyAvailable():
+        packed = np.frombuffer(mask.to_bytes((mask.bit_length() + 7) // 8, 'little'), dtype=np.uint8)
+        return np.nonzero(np.unpackbits(packed, bitorder='little'))[0].tolist()
+    bits = bin(mask)[:1:-1]
+    positions = []
+    position = bits.find('1')
+    while position != -1:
+        positions.append(position)
+        position = bits.find('1', position + 1)
+    return positions
+
+# Every valid offset of every crib in one pass over the encrypted text - {crib: [offsets]}
+def scanCribs(cribs, encryptedText):
+    masks, length = letterMasks(encryptedText)
+    return {crib: bitPositions(cribMask(crib, masks, length)) for crib in cribs}
+
+# Compiled engine of a search unit without plugboard - rotorOrder (left, middle, right) as numbered in
+# EnigmaMachine.setRotor, ringSetting [right, middle, left], navy (navy rotor choice, rotation) or None
+def unitEngine(rotorOrder, reflector, ringSetting=(1, 1, 1), navy=None):
+    left, middle, right = rotorOrder
+    machine = EnigmaMachine(rotorChoices[right], rotorChoices[middle], rotorChoices[left], reflector)
+    machine.setRingSetting(list(ringSetting))
+    if navy is not None:
+        machine.setRotor(4, navy[0])
+        machine.NavyRotor.setRotate(navy[1])
+    return CompiledEnigma(machine)
+
+# Key-space canonicalization
+#   A rotor's wiring only depends on its offset, rotation - ring.  The ring setting on its own only moves the
+#   point where the rotor turns over its left neighbour, so over a message of length letters two keys with the
+#   same offsets encipher identically unless their rotors step at different keypresses:
+#     left ring - never matters, only the left offset does
+#     middle ring - matters only through the middle kicks (right turnovers) at which the middle double steps
+#     right ring - matters only through the keypresses at which the right rotor kicks the middle
+#   Keys are grouped exactly by those step times, the canonical key of a group has the smallest right and
+#   middle rotations of its group and left ring 1.  Without any turnover in the message that is a 26**2 cut
+def rotorTurnovers(choice):
+    return turnoverRotations(rotor.fromWiring(rotorChoices[choice]))
+
+# Keypresses (1..length) at which a rotor stepping on every keypress from rotation kicks the next rotor
+def turnoverTimes(rotation, turnovers, length):
+    times = []
+    for keypress in range(1, length + 1):
+        rotation = rotation % 26 + 1
+        if rotation in turnovers:
+            times.append(keypress)
+    return tuple(times)
+
+# Kicks (1..kicks) at which a middle rotor kicked from rotation double steps, as in EnigmaMachine.rotateRotors
+def doubleStepTimes(rotation, turnovers, kicks):
+    times = []
+    for kick in range(1, kicks + 1):
+        rotation = rotation % 26 + 1
+        if rotation in turnovers:
+            times.append(kick)
+            rotation = rotation % 26 + 1
+    return tuple(times)
+
+# Canonical right rotations of a rotor order, each with its canonical middle rotations - [(right, [middle])]
+def canonicalPhases(rotorOrder, length):
+    left, middle, right = rotorOrder
+    rightTurnover = rotorTurnovers(right)
+    middleTurnover = rotorTurnovers(middle)
+    rights = OrderedDict()
+    for rotation in range(1, 27):
+        rights.setdefault(turnoverTimes(rotation, rightTurnover, length), rotation)
+    phases = []
+    for times, right in rights.items():
+        middles = OrderedDict()
+        for rotation in range(1, 27):
+            middles.setdefault(doubleStepTimes(rotation, middleTurnover, len(times)), rotation)
+        phases.append((right, list(middles.values())))
+    return phases
+
+# Start state codes (as in CompiledEnigma.stateArray) of the canonical rotations, the same for every ring setting
+def canonicalStarts(rotorOrder, length):
+    starts = [(left * 27 + middle) * 27 + right for right, middles in canonicalPhases(rotorOrder, length)
+              for middle in middles for left in range(1, 27)]
+    return np.array(sorted(starts), dtype=np.intp) if numpyAvailable() else sorted(starts)
+
+# Ring settings [right, middle, left] to sweep with canonicalStarts - the left ring is fixed
+def canonicalRings():
+    return [(right, middle, 1) for right in range(1, 27) for middle in range(1, 27)]
+
+# State codes of a ring setting [right, middle, left] mapped to the state of ring setting (1, 1, 1) with the same
+# scrambler.  Every rotor table depends only on rotation - ring and stepping only on the rotation, so one table
+# built at ring (1, 1, 1) serves every ring setting
+def ringStateMap(ringSetting):
+    rotation = np.arange(27)
+    right, middle, left = ((rotation - ring) % 26 + 1 for ring in ringSetting)
+    return ((left[:, None, None] * 27 + middle[None, :, None]) * 27 + right[None, None, :]).ravel()
+
+# One (ringSetting, rotation) per group of equivalent keys of a rotor order, both [right, middle, left]
+def canonicalKeys(rotorOrder, length):
+    phases = canonicalPhases(rotorOrder, length)
+    for ringSetting in canonicalRings():
+        for right, middles in phases:
+            for middle in middles:
+                for left in range(1, 27):
+                    yield ringSetting, [right, middle, left]
+
+# Canonical (ringSetting, rotation) of any key - it enciphers every message of up to length letters the same
+def canonicalKey(rotorOrder, ringSetting, rotation, length):
+    left, middle, right = rotorOrder
+    rightTurnover = rotorTurnovers(right)
+    middleTurnover = rotorTurnovers(middle)
+    times = turnoverTimes(rotation[0], rightTurnover, length)
+    canonicalRight = next(r for r in range(1, 27) if turnoverTimes(r, rightTurnover, length) == times)
+    doubles = doubleStepTimes(rotation[1], middleTurnover, len(times))
+    canonicalMiddle = next(m for m in range(1, 27) if doubleStepTimes(m, middleTurnover, len(times)) == doubles)
+    ring = [(canonicalRight - (rotation[0] - ringSetting[0]) - 1) % 26 + 1,
+            (canonicalMiddle - (rotation[1] - ringSetting[1]) - 1) % 26 + 1, 1]
+    return ring, [canonicalRight, canonicalMiddle, (rotation[2] - ringSetting[2]) % 26 + 1]
+
+# Bombe stop - settings that map the crib onto the encrypted text
+#   rotorOrder - (left, middle, right) rotor choices as numbered in EnigmaMachine.setRotor
+#   rotation - [right, middle, left] start rotation of the message, as in EnigmaMachine.setRotorRotation
+#   plugboard - deduced pairs as a setPlugboard string, a letter paired with itself is left out
+#   navy - (navy rotor choice, rotation) for four rotor searches, None otherwise
+BombeStop = namedtuple('BombeStop', ['rotorOrder', 'reflector', 'ringSetting', 'rotation', 'cribPosition', 'plugboard', 'navy'],
+                       defaults=(None,))
+
+# Class for the checkpoint journal of a Bombe sweep
+# Includes:
+#   path - journal file, one JSON record per line
+#   search - digest of the sweep (crib, encrypted text, units, ring setting), a journal of another sweep is refused
+#   done - indices of the units already finished, stops - their stops
+#   syncInterval - seconds between fsyncs of the journal
+#
+#   The first line names the sweep, each later line is one finished shard: its unit indices and stops.  Records are
+#   appended with a single write, a crash can only tear the last line, which is cut off when the journal is
+#   reopened (only once the header shows the journal is this sweep's, a journal of another sweep is left as it
+#   is).  Resuming skips every unit in done; a unit (a whole shard for runBombeParallel) is journaled only when
+#   it finishes, so one interrupted part way is tested again in full
+#
+class BombeCheckpoint:
+
+    VERSION = 1
+
+    def __init__(self, path, search, syncInterval=5.0):
+        self.path = path
+        self.search = search
+        self.syncInterval = syncInterval
+        self.done = set()
+        self.stops = []
+        self.load()
+        self.handle = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        self.lastSync = time.monotonic()
+        if os.fstat(self.handle).st_size == 0:
+            os.write(self.handle, self.headerLine())
+            self.sync()
+
+    def load(self):
+        try:
+            with open(self.path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return
+        if not data:
+            return
+        if b'\n' in data:
+            header = json.loads(data[: data.index(b'\n')])
+            if header.get('version') != self.VERSION or header.get('search') != self.search:
+                raise ValueError('%s is the checkpoint of another Bombe sweep' % self.path)
+        elif not self.headerLine().startswith(data):
+            raise ValueError('%s is not a Bombe checkpoint' % self.path)
+        complete = data[: data.rfind(b'\n') + 1]
+        if len(complete) != len(data):
+            with open(self.path, 'r+b') as f:
+                f.truncate(len(complete))
+        lines = complete.splitlines()
+        for line in lines[1:]:
+            record = json.loads(line)
+            self.done.update(record['units'])
+            self.stops.extend(BombeStop(tuple(rotorOrder), reflector, tuple(ringSetting), list(rotation), cribPosition,
+                                        plugboard, tuple(navy) if navy is not None else None)
+                              for rotorOrder, reflector, ringSetting, rotation, cribPosition, plugboard, navy in record['stops'])
+
+    def headerLine(self):
+        return self.line({'version': self.VERSION, 'search': self.search})
+
+    def line(self, record):
+        return (json.dumps(record, separators=(',', ':')) + '\n').encode('ascii')
+
+    def append(self, record):
+        os.write(self.handle, self.line(record))
+
+    def sync(self):
+        os.fsync(self.handle)
+        self.lastSync = time.monotonic()
+
+    # Journal a finished shard - unit indices and their stops
+    def record(self, units, stops):
+        self.append({'units': list(units), 'stops': [list(stop) for stop in stops]})
+        self.done.update(units)
+        if time.monotonic() - self.lastSync >= self.syncInterval:
+            self.sync()
+
+    def close(self):
+        if self.handle is not None:
+            self.sync()
+            os.close(self.handle)
+            self.handle = None
+
+# Class for Bombe Machine Operation
+# Includes:
+#   crib - substring believed to be contained in encryptedText
+#   cribPosition - position of the start of the crib in relation to encryptedText (letters only, spaces do not step)
+#   encryptedText - text to be decrypted/analyzed
+#   settingsFound - array of BombeStop settings that map the crib onto part of the encrypted text, includes false positives
+#   enigmaArray - array of enigmas set to progressive rotations to find matches
+#   menu - letter -> [(other letter, crib offset)], pairs of crib/encrypted letters joined by the scrambler at that offset
+#   menuLoops - closed walks through the test letter, each a list of (letter, crib offset, next letter)
+#   
+#   Initialization, crib/encryptedText letter by letter validity check (Enigma cannot map a letter as itself),
+#   menu and loop construction, sweep of rotor orders/reflectors/start positions
+#   
+#   Every start position of a rotor order is tested at once with numpy: the plugboard partner of the test
+#   letter must be a fixed point of the scrambler composed around every loop.  Surviving hypotheses are
+#   propagated through the whole menu with the diagonal board (deducePlugboard), consistent ones are stops.
+#   
+class BombeMachine:
+    
+    def __init__(self):
+        print("It's a Bombe!")
+        self.crib = ''
+        self.cribPosition = 0
+        self.encryptedText = ''
+        self.settingsFound = []
+        self.enimgaArray = [EnigmaMachine(rotor1, rotor2, rotor3, reflectorA) for i in range(36)]
+        self.menu = {}
+        self.menuLoops = []
+        self.testLetter = None
+
+    def setCrib(self, crib, encryptedText, cribPosition=0):
+        self.crib = crib.replace(' ', '').upper()
+        self.encryptedText = encryptedText.replace(' ', '').upper()
+        self.cribPosition = cribPosition
+
+    # Every offset where the crib can sit on the encrypted text
+    def validCribPositions(self):
+        masks, length = letterMasks(self.encryptedText)
+        return bitPositions(cribMask(self.crib, masks, length))
+
+    # Move cribPosition to the first position at or after it where no crib letter sits on itself
+    def checkCribPosition(self):
+        masks, length = letterMasks(self.encryptedText)
+        valid = cribMask(self.crib, masks, length) >> self.cribPosition
+        if valid == 0:
+            return False
+        self.cribPosition += (valid & -valid).bit_length() - 1
+        return True
+
+    # Letter pair menu of the crib at cribPosition and its closed loops through the test letter
+    def buildMenu(self):
+        self.menu = {}
+        searchEncrypt = self.encryptedText[ self.cribPosition : self.cribPosition + len(self.crib) ]
+        for i in range( len(self.crib) ):
+            a = alphabet.index(self.crib[i])
+            b = alphabet.index(searchEncrypt[i])
+            self.menu.setdefault(a, []).append((b, i))
+            self.menu.setdefault(b, []).append((a, i))
+        self.testLetter = max(self.menu, key=lambda letter: len(self.menu[letter])) if self.menu else None
+        self.menuLoops = self.findLoops(self.testLetter)
+        return self.menu
+
+    # Fundamental cycles of the spanning tree rooted at the test letter, each turned into a closed walk
+    #   test letter -> tree path -> non-tree edge -> tree path -> test letter
+    def findLoops(self, root):
+        if root is None:
+            return []
+        parent = {root: None}
+        order = [root]
+        treeEdges = set()
+        for letter in order:
+            for other, offset in self.menu[letter]:
+                if other not in parent:
+                    parent[other] = (letter, offset)
+                    treeEdges.add(offset)
+                    order.append(other)
+
+        def pathToRoot(letter):
+            path = []
+            while parent[letter] is not None:
+                previous, offset = parent[letter]
+                path.append((letter, offset, previous))
+                letter = previous
+            return path
+
+        loops = []
+        seen = set()
+        for letter in order:
+            for other, offset in self.menu[letter]:
+                if offset in treeEdges or offset in seen:
+                    continue
+                seen.add(offset)
+                back = pathToRoot(other)
+                out = [(b, i, a) for a, i, b in reversed(pathToRoot(letter))]
+                loops.append(out + [(letter, offset, other)] + back)
+        return loops
+
+    # Machine state of every start position at each crib letter, states coded as in CompiledEnigma.stateArray
+    #   starts - start state codes to test, every start position by default
+    def cribStates(self, engine, starts=None):
+        nextState = engine.stepArray()
+        if starts is None:
+            rotation = np.arange(1, 27)
+            starts = ((rotation[:, None, None] * 27 + rotation[None, :, None]) * 27 + rotation[None, None, :]).ravel()
+        states = starts
+        for i in range(self.cribPosition + 1):
+            states = nextState[states]
+        cribStates = [states]
+        for i in range(1, len(self.crib)):
+            states = nextState[states]
+            cribStates.append(states)
+        return starts, cribStates
+
+    # Plugboard partners of the test letter that survive every loop, for all start positions at once
+    def loopCandidates(self, scrambler, cribStates):
+        letters = np.arange(26)
+        candidates = np.ones((cribStates[0].size, 26), dtype=bool)
+        for loop in self.menuLoops:
+            num = np.broadcast_to(letters, candidates.shape)
+            for letter, offset, other in loop:
+                num = scrambler[cribStates[offset][:, None] * 26 + num]
+            candidates &= num == letters
+        return candidates
+
+    # Propagate the hypothesis 'test letter is plugged to hypothesis' through the menu with the diagonal board
+    #   scramblers[offset] is the scrambler permutation at that crib letter.  Returns the plugboard partners
+    #   (letter -> letter) or None on a contradiction
+    def deducePlugboard(self, hypothesis, scramblers):
+        steckers = [None] * 26
+        steckers[self.testLetter] = hypothesis
+        steckers[hypothesis] = self.testLetter
+        queue = [self.testLetter]
+        if hypothesis != self.testLetter:
+            queue.append(hypothesis)
+        while queue:
+            letter = queue.pop()
+            partner = steckers[letter]
+            for other, offset in self.menu.get(letter, ()):
+                mapped = scramblers[offset][partner]
+                if steckers[other] is None and steckers[mapped] is None:
+                    steckers[other] = mapped
+                    steckers[mapped] = other
+                    queue.append(other)
+                    if mapped != other:
+                        queue.append(mapped)
+                elif steckers[other] != mapped:
+                    return None
+        return steckers
+
+    # Test every start position of one rotor order/reflector/ring setting, adding stops to settingsFound
+    #   navy - optional (navy rotor choice, rotation), the navy rotor does not step so it is part of the unit
+    #   starts - start state codes to test (e.g. canonicalStarts), every start position by default
+    def testRotorOrder(self, rotorOrder, reflector, ringSetting=(1, 1, 1), navy=None, starts=None):
+        return self.testRings(rotorOrder, reflector, [ringSetting], navy, starts)
+
+    # testRotorOrder for many ring settings at once.  The scrambler table and crib states are built once at ring
+    # setting (1, 1, 1), each ring setting only maps the crib states through ringStateMap
+    def testRings(self, rotorOrder, reflector, rings, navy=None, starts=None):
+        instrumented = metrics
+        if instrumented is not None:
+            started = time.perf_counter()
+        engine = unitEngine(rotorOrder, reflector, (1, 1, 1), navy)
+        scrambler = engine.stateArray()
+        starts, baseStates = self.cribStates(engine, starts)
+        if instrumented is not None:
+            instrumented.addSpan('bombe.tables', time.perf_counter() - started)
+
+        stops = []
+        contradictions = 0
+        loopsTime = deduceTime = 0.0
+        for ringSetting in rings:
+            ringSetting = tuple(ringSetting)
+            if instrumented is not None:
+                ringStarted = time.perf_counter()
+            if ringSetting == (1, 1, 1):
+                cribStates = baseStates
+            else:
+                stateMap = ringStateMap(ringSetting)
+                cribStates = [stateMap[states] for states in baseStates]
+            candidates = self.loopCandidates(scrambler, cribStates)
+            if instrumented is not None:
+                loopsDone = time.perf_counter()
+                loopsTime += loopsDone - ringStarted
+            for position, hypothesis in zip(*np.nonzero(candidates)):
+                scramblers = [scrambler[states[position] * 26 : states[position] * 26 + 26] for states in cribStates]
+                steckers = self.deducePlugboard(int(hypothesis), scramblers)
+                if steckers is None:
+                    contradictions += 1
+                    continue
+                start = int(starts[position])
+                pairs = ' '.join(alphabet[a] + alphabet[b] for a, b in enumerate(steckers) if b is not None and a < b)
+                stops.append(BombeStop(tuple(rotorOrder), reflector, ringSetting,
+                                       [start % 27, start // 27 % 27, start // 729], self.cribPosition, pairs,
+                                       tuple(navy) if navy is not None else None))
+            if instrumented is not None:
+                deduceTime += time.perf_counter() - loopsDone
+        if instrumented is not None:
+            instrumented.addSpan('bombe.loops', loopsTime, len(rings))
+            instrumented.addSpan('bombe.deduce', deduceTime, len(rings))
+            instrumented.count(positionsTested=starts.size * len(rings), stops=len(stops), contradictions=contradictions)
+        self.settingsFound.extend(stops)
+        return stops
+
+    # One work unit - at ringSetting, or canonical: every ring setting from the canonical start positions
+    def testUnit(self, rotorOrder, reflector, navy=None, ringSetting=(1, 1, 1), canonical=False):
+        if canonical:
+            starts = canonicalStarts(rotorOrder, len(self.encryptedText))
+            return self.testRings(rotorOrder, reflector, canonicalRings(), navy, starts)
+        return self.testRotorOrder(rotorOrder, reflector, ringSetting, navy)
+
+    # Work units of a sweep - (rotor order, reflector, navy) for every rotor order (8P3 by default), reflector
+    # and, when navyRotors are given (e.g. [10, 11]), every navy rotor and navy rotation
+    def searchUnits(self, rotorOrders=None, reflectors=None, navyRotors=None):
+        if rotorOrders is None:
+            rotorOrders = [(l, m, r) for l in range(1, 9) for m in range(1, 9) for r in range(1, 9) if len({l, m, r}) == 3]
+        if reflectors is None:
+            reflectors = reflectorList
+        navies = [None]
+        if navyRotors:
+            navies = [(choice, rotation) for choice in navyRotors for rotation in range(1, 27)]
+        return [(tuple(rotorOrder), reflector, navy) for reflector in reflectors for navy in navies for rotorOrder in rotorOrders]
+
+    # Full sweep in this process - every unit at every start position
+    #   canonical - sweep every ring setting instead of ringSetting, testing one key of each group of keys
+    #   that encipher the whole intercept the same (see canonicalKeys) - equivalent up to the end of the crib only
+    #   would stop on keys that part from the true one after the crib
+    #   progress - optional ProgressReporter, advanced once per unit
+    #   checkpoint - optional journal path, each finished unit is journaled and a rerun with the same path skips
+    #   the units already done (their stops go back into settingsFound)
+    def runBombe(self, rotorOrders=None, reflectors=None, ringSetting=(1, 1, 1), navyRotors=None, progress=None,
+                 canonical=False, checkpoint=None):
+        if not numpyAvailable():
+            raise ImportError('the Bombe requires numpy')
+        if not self.checkCribPosition():
+            return self.settingsFound
+        self.buildMenu()
+        units = self.searchUnits(rotorOrders, reflectors, navyRotors)
+        journal = self.openCheckpoint(checkpoint, units, ringSetting, canonical)
+        try:
+            remaining = [index for index in range(len(units)) if journal is None or index not in journal.done]
+            if progress is not None:
+                progress.start(len(remaining))
+            for index in remaining:
+                rotorOrder, reflector, navy = units[index]
+                stops = self.testUnit(rotorOrder, reflector, navy, ringSetting, canonical)
+                if journal is not None:
+                    journal.record([index], stops)
+                if progress is not None:
+                    progress.advance(1, len(stops))
+            if progress is not None:
+                progress.finish()
+        finally:
+            if journal is not None:
+                journal.close()
+        return self.settingsFound
+
+    # Checkpoint journal of a sweep (None without a path), stops of finished units are put back in settingsFound
+    def openCheckpoint(self, path, units, ringSetting, canonical=False):
+        if path is None:
+            return None
+        search = hashlib.sha1(repr((self.crib, self.encryptedText, self.cribPosition, units, tuple(ringSetting),
+                                    canonical)).encode('ascii')).hexdigest()
+        journal = BombeCheckpoint(path, search)
+        self.settingsFound.extend(journal.stops)
+        return journal
+
+    # Full sweep on a process pool.  Units are grouped into shards of chunkSize, stops are yielded (and added
+    # to settingsFound) as shards finish.  Once a stop passes confirm (any stop if confirm is None and
+    # stopOnFirst is set) the remaining shards are cancelled.  Worker counters are merged into the installed
+    # metrics as shards finish, progress is advanced per shard.  With a checkpoint path finished shards are
+    # journaled as in runBombe, a rerun skips them and does not yield their stops again.  canonical is as in
+    # runBombe, each worker sweeps the canonical ring settings of its units
+    def runBombeParallel(self, rotorOrders=None, reflectors=None, ringSetting=(1, 1, 1), navyRotors=None,
+                         workers=None, chunkSize=4, confirm=None, stopOnFirst=False, progress=None, checkpoint=None,
+                         canonical=False):
+        if not numpyAvailable():
+            raise ImportError('the Bombe requires numpy')
+        if not self.checkCribPosition():
+            return
+        self.buildMenu()
+        units = self.searchUnits(rotorOrders, reflectors, navyRotors)
+        journal = self.openCheckpoint(checkpoint, units, ringSetting, canonical)
+        remaining = [index for index in range(len(units)) if journal is None or index not in journal.done]
+        shards = [remaining[i : i + chunkSize] for i in range(0, len(remaining), chunkSize)]
+        if progress is not None:
+            progress.start(len(remaining))
+
+        import concurrent.futures
+        executor = concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=bombeWorkerInit,
+                                                          initargs=(self.crib, self.encryptedText, self.cribPosition,
+                                                                    metrics is not None,
+                                                                    scramblerCache.directory if scramblerCache is not None else None))
+        try:
+            futures = {executor.submit(bombeShard, [units[index] for index in shard], tuple(ringSetting), canonical): shard
+                       for shard in shards}
+            for future in concurrent.futures.as_completed(futures):
+                stops, snapshot = future.result()
+                if snapshot is not None and metrics is not None:
+                    metrics.merge(snapshot)
+                if journal is not None:
+                    journal.record(futures[future], stops)
+                if progress is not None:
+                    progress.advance(len(futures[future]), len(stops))
+                for stop in stops:
+                    self.settingsFound.append(stop)
+                    yield stop
+                    if (confirm is not None and confirm(stop)) or (confirm is None and stopOnFirst):
+                        return
+            if progress is not None:
+                progress.finish()
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+            if journal is not None:
+                journal.close()
+
+    def incrementRotors(self):
+        for enigma in self.enimgaArray:
+            enigma.rotateRotors()
+    
+    def resetBombe(self):
+        self.crib = ''
+        self.cribPosition = 0
+        self.encryptedText = ''
+        self.invalidatedSettings = []
+        self.settingsFound = []
+        self.menu = {}
+        self.menuLoops = []
+        self.testLetter = None
+
+
+
+
+
+# n-gram log probability tables
+#   Compact binary file: NGRAM_MAGIC, one byte n, then 26**n little-endian float32 log10 probabilities
+#   indexed by the letter numbers of the n-gram read as a base 26 number
+NGRAM_MAGIC = b'NGRM'
+
+def buildNgramTable(sampleText, n, floor=0.01):
+    letters = np.frombuffer(''.join(c for c in sampleText.upper() if c in alphabet).encode('ascii'), dtype=np.uint8) - ord('A')
+    counts = np.bincount(ngramIndex(letters[None, :], n).ravel(), minlength=26 ** n).astype(np.float64)
+    return np.log10((counts + floor) / (counts.sum() + floor * counts.size)).astype(np.float32)
+
+def saveNgramTable(path, table):
+    n = int(round(np.log(table.size) / np.log(26)))
+    with open(path, 'wb') as f:
+        f.write(NGRAM_MAGIC + bytes([n]))
+        f.write(np.asarray(table, dtype='<f4').tobytes())
+
+def loadNgramTable(path):
+    with open(path, 'rb') as f:
+        data = f.read()
+    if data[:4] != NGRAM_MAGIC:
+        raise ValueError('%s is not an n-gram table' % path)
+    n = data[4]
+    table = np.frombuffer(data, dtype='<f4', offset=5)
+    if table.size != 26 ** n:
+        raise ValueError('%s is truncated' % path)
+    return table
+
+# n-gram numbers of every row of a (K, N) letter array, shape (K, N - n + 1)
+def ngramIndex(letters, n, out=None):
+    length = letters.shape[1] - n + 1
+    index = np.zeros((letters.shape[0], max(length, 0)), dtype=np.int32) if out is None else out
+    index[...] = letters[:, :length]
+    for j in range(1, n):
+        index *= 26
+        index += letters[:, j : j + length]
+    return index
+
+# Index of coincidence of each row of a (K, 26) letter count array
+def indexOfCoincidence(counts):
+    total = counts.sum(axis=-1)
+    return (counts * (counts - 1)).sum(axis=-1) / np.maximum(total * (total - 1), 1)
+
+# Candidate key of the statistical attack - fields as in BombeStop, score is the last stage's score
+AttackCandidate = namedtuple('AttackCandidate', ['rotorOrder', 'reflector', 'ringSetting', 'rotation', 'plugboard', 'score'])
+
+# Class for the ciphertext-only attack
+# Includes:
+#   letters - encrypted text as letter numbers (spaces removed, they do not step the rotors)
+#   bigrams/trigrams - n-gram log probability tables (loadNgramTable), optional
+#   candidates - best keys found so far, best first
+#
+#   Rank every start position of each rotor order/reflector by index of coincidence, then hill-climb ring
+#   settings and plugboard pairs on n-gram scores.  All scoring is numpy over whole batches of trial
+#   decryptions: every start position of a rotor order at once, then every plugboard change at once,
+#   working in buffers kept between calls
+#
+class StatisticalAttack:
+
+    def __init__(self, encryptedText, bigrams=None, trigrams=None):
+        if not numpyAvailable():
+            raise ImportError('the statistical attack requires numpy')
+        text = encryptedText.replace(' ', '').upper().encode('ascii')
+        self.letters = np.frombuffer(text, dtype=np.uint8).astype(np.intp) - ord('A')
+        self.bigrams = bigrams
+        self.trigrams = trigrams
+        self.candidates = []
+        self.buffers = {}
+
+    def buffer(self, name, shape, dtype):
+        array = self.buffers.get(name)
+        if array is None or array.shape != shape or array.dtype != dtype:
+            array = np.empty(shape, dtype=dtype)
+            self.buffers[name] = array
+        return array
+
+    def engine(self, rotorOrder, reflector, ringSetting, navy=None):
+        return unitEngine(rotorOrder, reflector, ringSetting, navy)
+
+    # Scrambler state codes of every letter for one start rotation [right, middle, left]
+    def letterStates(self, engine, rotation):
+        rights, middles, lefts = engine.rotationArrays(rotation, self.letters.size)
+        return (lefts * 27 + middles) * 27 + rights
+
+    # n-gram score of each row of a (K, N) letter array, with the best table loaded
+    def score(self, plaintexts):
+        if self.trigrams is not None:
+            table, n = self.trigrams, 3
+        elif self.bigrams is not None:
+            table, n = self.bigrams, 2
+        else:
+            counts = np.zeros((plaintexts.shape[0], 26), dtype=np.int64)
+            np.add.at(counts, (np.arange(plaintexts.shape[0])[:, None], plaintexts), 1)
+            return indexOfCoincidence(counts)
+        index = ngramIndex(plaintexts, n, self.buffer('ngrams', (plaintexts.shape[0], plaintexts.shape[1] - n + 1), np.int32))
+        return table[index].sum(axis=1)
+
+    # Every start position of one rotor order/reflector ranked by index of coincidence, best first
+    def rankStartPositions(self, rotorOrder, reflector, ringSetting=(1, 1, 1), keep=10, blockSize=1 << 22):
+        engine = self.engine(rotorOrder, reflector, ringSetting)
+        scrambler = engine.stateArray().astype(np.intp)
+        nextState = engine.stepArray()
+        rotation = np.arange(1, 27)
+        starts = ((rotation[:, None, None] * 27 + rotation[None, :, None]) * 27 + rotation[None, None, :]).ravel()
+
+        # The intercept is taken rows letters at a time, so the rows x starts buffers stay around blockSize
+        # entries however long it is, the letter counts of every start are summed over the blocks
+        length = self.letters.size
+        rows = max(1, min(length, blockSize // starts.size))
+        states = self.buffer('states', (rows, starts.size), np.intp)
+        plain = self.buffer('plain', (rows, starts.size), np.intp)
+        offsets = np.arange(starts.size) * 26
+        counts = np.zeros(starts.size * 26, dtype=np.intp)
+        state = starts
+        for begin in range(0, length, rows):
+            block = min(rows, length - begin)
+            np.take(nextState, state, out=states[0])
+            for i in range(1, block):
+                np.take(nextState, states[i - 1], out=states[i])
+            state = states[block - 1].copy()
+            np.multiply(states[:block], 26, out=plain[:block])
+            plain[:block] += self.letters[begin : begin + block, None]
+            np.take(scrambler, plain[:block], out=plain[:block])
+            plain[:block] += offsets
+            counts += np.bincount(plain[:block].ravel(), minlength=starts.size * 26)
+        counts = counts.reshape(starts.size, 26)
+        scores = indexOfCoincidence(counts)
+
+        best = np.argsort(scores)[::-1][:keep]
+        return [AttackCandidate(tuple(rotorOrder), reflector, tuple(ringSetting),
+                                [int(starts[i]) % 27, int(starts[i]) // 27 % 27, int(starts[i]) // 729], '', float(scores[i]))
+                for i in best]
+
+    # First stage over every rotor order (8P3 by default) and reflector, keeping the best overall
+    def rankRotorOrders(self, rotorOrders=None, reflectors=None, keep=100, keepPerOrder=10):
+        if rotorOrders is None:
+            rotorOrders = [(l, m, r) for l in range(1, 9) for m in range(1, 9) for r in range(1, 9) if len({l, m, r}) == 3]
+        if reflectors is None:
+            reflectors = reflectorList
+        ranked = []
+        for reflector in reflectors:
+            for rotorOrder in rotorOrders:
+                ranked.extend(self.rankStartPositions(rotorOrder, reflector, keep=keepPerOrder))
+        ranked.sort(key=lambda candidate: candidate.score, reverse=True)
+        return ranked[:keep]
+
+    # Hill-climb the right then middle ring setting.  Moving ring and rotation together keeps the wiring
+    # offset (rotation - ring) of the start, so only the turnover point moves
+    #   Shifts that step the rotors at the same keypresses as an earlier shift encipher the same (see
+    #   canonicalKeys), so only the first of each is scored.  Every trial reads the one engine built at ring
+    #   setting (1, 1, 1), its states mapped through ringStateMap
+    def climbRings(self, candidate):
+        left, middle, right = candidate.rotorOrder
+        rightTurnover = rotorTurnovers(right)
+        middleTurnover = rotorTurnovers(middle)
+        length = self.letters.size
+        engine = self.engine(candidate.rotorOrder, candidate.reflector, (1, 1, 1))
+        scrambler = engine.stateArray()
+        plugboard = plugboardArray(candidate.plugboard)
+        for wheel in (0, 1):
+            trials = []
+            seen = set()
+            plaintexts = self.buffer('ringTrials', (26, self.letters.size), np.intp)
+            for shift in range(26):
+                ringSetting = list(candidate.ringSetting)
+                rotation = list(candidate.rotation)
+                ringSetting[wheel] = (ringSetting[wheel] + shift - 1) % 26 + 1
+                rotation[wheel] = (rotation[wheel] + shift - 1) % 26 + 1
+                times = turnoverTimes(rotation[0], rightTurnover, length)
+                if wheel == 1:
+                    times = doubleStepTimes(rotation[1], middleTurnover, len(times))
+                if times in seen:
+                    continue
+                seen.add(times)
+                states = ringStateMap(ringSetting)[self.letterStates(engine, rotation)]
+                plaintexts[len(trials)] = plugboard[scrambler[states * 26 + plugboard[self.letters]]]
+                trials.append((tuple(ringSetting), rotation))
+            scores = self.score(plaintexts[:len(trials)])
+            best = int(np.argmax(scores))
+            candidate = candidate._replace(ringSetting=trials[best][0], rotation=trials[best][1], score=float(scores[best]))
+        return candidate
+
+    # Hill-climb plugboard pairs - every pair toggle of the current plugboard is scored in one batch
+    #   Works on anything with AttackCandidate's fields, and a navy field for four rotor keys
+    #   fixed - letters whose plugging is kept as in the candidate (e.g. the pairs a Bombe stop deduced)
+    def climbPlugboard(self, candidate, maxPairs=10, fixed=''):
+        engine = self.engine(candidate.rotorOrder, candidate.reflector, candidate.ringSetting, getattr(candidate, 'navy', None))
+        states = self.letterStates(engine, candidate.rotation) * 26
+        scrambler = engine.stateArray().astype(np.intp)
+        fixed = {alphabet.index(letter) for letter in fixed if letter in alphabet}
+        pairs = [(a, b) for a in range(26) for b in range(a + 1, 26) if a not in fixed and b not in fixed]
+        if not pairs:
+            return candidate
+        plugboard = plugboardArray(candidate.plugboard)
+        best = float(self.score(plugboard[scrambler[states + plugboard[self.letters]]][None, :])[0])
+
+        plugboards = self.buffer('plugboards', (len(pairs), 26), np.intp)
+        plaintexts = self.buffer('plugTrials', (len(pairs), self.letters.size), np.intp)
+        while True:
+            for k, (a, b) in enumerate(pairs):
+                plugboards[k] = plugboard
+                togglePair(plugboards[k], a, b)
+            offsets = np.arange(len(pairs))[:, None] * 26
+            np.take(plugboards, offsets + self.letters[None, :], out=plaintexts)
+            plaintexts += states[None, :]
+            np.take(scrambler, plaintexts, out=plaintexts)
+            plaintexts += offsets
+            np.take(plugboards, plaintexts, out=plaintexts)
+            scores = self.score(plaintexts)
+            pairCounts = (plugboards != np.arange(26)).sum(axis=1) // 2
+            scores[pairCounts > maxPairs] = -np.inf
+            k = int(np.argmax(scores))
+            if scores[k] <= best:
+                break
+            best = float(scores[k])
+            plugboard = plugboards[k].copy()
+        return candidate._replace(plugboard=plugboardString(plugboard), score=best)
+
+    # Whole attack - index of coincidence ranking, ring settings, plugboard.  Candidates are kept best first
+    def run(self, rotorOrders=None, reflectors=None, keep=100, maxPairs=10):
+        ranked = self.rankRotorOrders(rotorOrders, reflectors, keep)
+        self.candidates = [self.climbPlugboard(self.climbRings(candidate), maxPairs) for candidate in ranked]
+        self.candidates.sort(key=lambda candidate: candidate.score, reverse=True)
+        return self.candidates
+
+
+# Verified Bombe stop - key of the stop with its plugboard completed, n-gram score and plaintext of the intercept
+VerifiedStop = namedtuple('VerifiedStop', ['rotorOrder', 'reflector', 'ringSetting', 'rotation', 'plugboard', 'navy',
+                                           'score', 'plaintext'])
+
+# Verify a batch of stops against the whole intercept of attack.  Every stop is decrypted with its Bombe plugboard
+# in one MultiKeyEnigma pass and scored, stops scoring below minScore are dropped, the rest get their plugboard
+# completed by climbPlugboard, which never changes the pairs the Bombe deduced.  Without an n-gram table the
+# attack scores by index of coincidence, which a plugboard climb games into garbage, so the Bombe plugboard is
+# kept as it is.  Returns VerifiedStops in the order of the stops
+def verifyStops(attack, stops, maxPairs=PLUGBOARD_CABLES, minScore=None):
+    if not stops:
+        return []
+    climb = attack.bigrams is not None or attack.trigrams is not None
+    scores = attack.score(MultiKeyEnigma(stops).cryptionArray(attack.letters).astype(np.intp))
+    completed = []
+    for stop, score in zip(stops, scores):
+        if minScore is not None and score < minScore:
+            continue
+        candidate = VerifiedStop(tuple(stop.rotorOrder), stop.reflector, tuple(stop.ringSetting), list(stop.rotation),
+                                 stop.plugboard if isinstance(stop.plugboard, str) else plugboardString(stop.plugboard),
+                                 getattr(stop, 'navy', None), float(score), None)
+        completed.append(attack.climbPlugboard(candidate, maxPairs, candidate.plugboard) if climb else candidate)
+    if not completed:
+        return []
+    plaintexts = MultiKeyEnigma(completed).cryptionArray(attack.letters) + ord('A')
+    return [candidate._replace(plaintext=row.tobytes().decode('ascii')) for candidate, row in zip(completed, plaintexts)]
+
+# Class for verifying Bombe stops while the sweep is still running
+# Includes:
+#   queue - bounded queue of stops waiting for verification, put() blocks while it is full
+#   executor - process pool the batches are verified on (None to verify on the dispatch thread)
+#   ranked - heap of the best keep VerifiedStops
+#   verified - number of stops verified so far
+#
+#   A dispatch thread takes stops off the queue, groups them into batches of batchSize (a partial batch goes
+#   once the queue has been quiet for flushDelay seconds) and keeps at most two batches per worker in
+#   flight, so memory stays bounded however many stops the search produces.  While batches are in flight it
+#   wakes every flushDelay seconds to collect the finished ones, so results() is current during a quiet sweep
+#
+class StopVerifier:
+
+    CLOSE = object()
+
+    def __init__(self, encryptedText, bigrams=None, trigrams=None, workers=None, batchSize=64, queueSize=1024,
+                 keep=20, maxPairs=PLUGBOARD_CABLES, minScore=None, flushDelay=0.5):
+        if not numpyAvailable():
+            raise ImportError('stop verification requires numpy')
+        self.batchSize = batchSize
+        self.keep = keep
+        self.maxPairs = maxPairs
+        self.minScore = minScore
+        self.flushDelay = flushDelay
+        self.queue = queue.Queue(maxsize=queueSize)
+        self.ranked = []
+        self.verified = 0
+        self.sequence = 0
+        self.error = None
+        self.lock = threading.Lock()
+        import concurrent.futures
+        if workers == 1:
+            self.executor = None
+            self.attack = StatisticalAttack(encryptedText, bigrams, trigrams)
+            self.window = 1
+        else:
+            self.executor = concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=verifierWorkerInit,
+                                                                   initargs=(encryptedText, bigrams, trigrams))
+            self.window = (workers or os.cpu_count() or 1) * 2
+        self.thread = threading.Thread(target=self.dispatch, daemon=True)
+        self.thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    # Queue a stop for verification, waiting while the queue is full
+    def put(self, stop):
+        self.queue.put(stop)
+
+    def dispatch(self):
+        pending = deque()
+        batch = []
+        closing = False
+        while not closing:
+            try:
+                stop = self.queue.get(timeout=self.flushDelay if batch or pending else None)
+            except queue.Empty:
+                stop = None
+            if stop is self.CLOSE:
+                closing = True
+            elif stop is not None:
+                batch.append(stop)
+            if batch and (len(batch) >= self.batchSize or stop is None or closing):
+                self.submit(pending, batch)
+                batch = []
+            while pending and (pending[0].done() or len(pending) >= self.window or closing):
+                self.collect(pending.popleft())
+
+    def submit(self, pending, batch):
+        import concurrent.futures
+        if self.error is not None:
+            return
+        if self.executor is None:
+            future = concurrent.futures.Future()
+            try:
+                future.set_result(verifyStops(self.attack, batch, self.maxPairs, self.minScore))
+            except Exception as error:
+                future.set_exception(error)
+        else:
+            future = self.executor.submit(verifierChunk, batch, self.maxPairs, self.minScore)
+        pending.append(future)
+
+    def collect(self, future):
+        try:
+            results = future.result()
+        except Exception as error:
+            self.error = self.error or error
+            return
+        with self.lock:
+            for verified in results:
+                self.sequence += 1
+                entry = (verified.score, self.sequence, verified)
+                if len(self.ranked) < self.keep:
+                    heapq.heappush(self.ranked, entry)
+                elif entry[0] > self.ranked[0][0]:
+                    heapq.heapreplace(self.ranked, entry)
+            self.verified += len(results)
+
+    # Best verified stops so far, best first
+    def results(self):
+        with self.lock:
+            return [verified for score, sequence, verified in sorted(self.ranked, reverse=True)]
+
+    # Verify what is still queued, stop the workers and return the ranking
+    def close(self):
+        if self.thread.is_alive():
+            self.queue.put(self.CLOSE)
+            self.thread.join()
+            if self.executor is not None:
+                self.executor.shutdown(wait=True)
+        if self.error is not None:
+            raise self.error
+        return self.results()
+
+# Verify a stream of stops, e.g. BombeMachine.runBombeParallel, as it is produced - returns the ranking
+def verifyStopStream(stops, encryptedText, bigrams=None, trigrams=None, **options):
+    with StopVerifier(encryptedText, bigrams, trigrams, **options) as verifier:
+        for stop in stops:
+            verifier.put(stop)
+    return verifier.results()
+
+# Class for the on-disk store of Bombe stops and verified candidates
+# Includes:
+#   path - SQLite database, opened in WAL mode so any number of processes can append to it while others query
+#   batchSize - rows buffered before they are written in one transaction, flush() writes the rest
+#   pending - rows not written yet
+#
+#   Every row belongs to an intercept (any id string).  Stops are stored without a score, verified stops with
+#   their score and plaintext.  The (intercept, score) index makes top() a seek whatever the size of the table,
+#   (intercept, rotorOrder) and (intercept, reflector) serve stops()
+#
+class ResultStore:
+
+    COLUMNS = ('intercept', 'rotorOrder', 'reflector', 'ringSetting', 'rotation', 'cribPosition', 'plugboard', 'navy',
+               'score', 'plaintext')
+
+    SCHEMA = (
+        'CREATE TABLE IF NOT EXISTS stops (id INTEGER PRIMARY KEY, intercept TEXT NOT NULL, rotorOrder TEXT NOT NULL,'
+        ' reflector TEXT NOT NULL, ringSetting TEXT NOT NULL, rotation TEXT NOT NULL, cribPosition INTEGER,'
+        ' plugboard TEXT, navy TEXT, score REAL, plaintext TEXT)',
+        'CREATE INDEX IF NOT EXISTS stopsScore ON stops (intercept, score DESC)',
+        'CREATE INDEX IF NOT EXISTS stopsRotorOrder ON stops (intercept, rotorOrder)',
+        'CREATE INDEX IF NOT EXISTS stopsReflector ON stops (intercept, reflector)',
+        )
+
+    def __init__(self, path, batchSize=10000, timeout=60.0):
+        self.path = path
+        self.batchSize = batchSize
+        self.pending = []
+        import sqlite3
+        self.connection = sqlite3.connect(path, timeout=timeout, isolation_level=None)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        for statement in self.SCHEMA:
+            self.write(statement)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    # Run statement over rows in one write transaction, BEGIN IMMEDIATE takes the write lock up front so
+    # concurrent writers wait for each other instead of failing
+    def write(self, statement, rows=((),)):
+        self.connection.execute('BEGIN IMMEDIATE')
+        try:
+            self.connection.executemany(statement, rows)
+        except BaseException:
+            self.connection.execute('ROLLBACK')
+            raise
+        self.connection.execute('COMMIT')
+
+    @staticmethod
+    def numbers(values):
+        return None if values is None else ' '.join(str(int(value)) for value in values)
+
+    @staticmethod
+    def parseNumbers(text):
+        return None if text is None else tuple(int(value) for value in text.split())
+
+    # Queue Bombe stops (BombeStop) of an intercept
+    def addStops(self, intercept, stops):
+        for stop in stops:
+            self.pending.append((intercept, self.numbers(stop.rotorOrder), stop.reflector,
+                                 self.numbers(stop.ringSetting), self.numbers(stop.rotation), stop.cribPosition,
+                                 stop.plugboard if isinstance(stop.plugboard, str) else plugboardString(stop.plugboard),
+                                 self.numbers(stop.navy), None, None))
+        if len(self.pending) >= self.batchSize:
+            self.flush()
+
+    # Queue verified candidates (VerifiedStop, or scored StatisticalAttack candidates) of an intercept
+    def addVerified(self, intercept, candidates):
+        for candidate in candidates:
+            self.pending.append((intercept, self.numbers(candidate.rotorOrder), candidate.reflector,
+                                 self.numbers(candidate.ringSetting), self.numbers(candidate.rotation), None,
+                                 candidate.plugboard, self.numbers(getattr(candidate, 'navy', None)),
+                                 float(candidate.score), getattr(candidate, 'plaintext', None)))
+        if len(self.pending) >= self.batchSize:
+            self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return
+        self.write('INSERT INTO stops (%s) VALUES (%s)' % (', '.join(self.COLUMNS), ', '.join('?' * len(self.COLUMNS))),
+                   self.pending)
+        self.pending = []
+
+    def close(self):
+        if self.connection is not None:
+            self.flush()
+            self.connection.close()
+            self.connection = None
+
+    # Best n verified candidates of an intercept, best first
+    def top(self, intercept, n=50):
+        self.flush()
+        rows = self.connection.execute('SELECT rotorOrder, reflector, ringSetting, rotation, plugboard, navy, score,'
+                                       ' plaintext FROM stops WHERE intercept = ? AND score IS NOT NULL'
+                                       ' ORDER BY score DESC LIMIT ?', (intercept, n))
+        return [VerifiedStop(self.parseNumbers(rotorOrder), reflector, self.parseNumbers(ringSetting),
+                             list(self.parseNumbers(rotation)), plugboard, self.parseNumbers(navy), score, plaintext)
+                for rotorOrder, reflector, ringSetting, rotation, plugboard, navy, score, plaintext in rows]
+
+    # Bombe stops of an intercept, optionally of one rotor order and/or reflector
+    def stops(self, intercept, rotorOrder=None, reflector=None):
+        self.flush()
+        query = ('SELECT rotorOrder, reflector, ringSetting, rotation, cribPosition, plugboard, navy FROM stops'
+                 ' WHERE intercept = ? AND score IS NULL')
+        arguments = [intercept]
+        if rotorOrder is not None:
+            query += ' AND rotorOrder = ?'
+            arguments.append(self.numbers(rotorOrder))
+        if reflector is not None:
+            query += ' AND reflector = ?'
+            arguments.append(reflector)
+        for rotorOrder, reflector, ringSetting, rotation, cribPosition, plugboard, navy in \
+                self.connection.execute(query, arguments):
+            yield BombeStop(self.parseNumbers(rotorOrder), reflector, self.parseNumbers(ringSetting),
+                            list(self.parseNumbers(rotation)), cribPosition, plugboard, self.parseNumbers(navy))
+
+    # Number of stored rows of an intercept - Bombe stops, verified candidates
+    def count(self, intercept):
+        self.flush()
+        return self.connection.execute('SELECT COUNT(*) - COUNT(score), COUNT(score) FROM stops WHERE intercept = ?',
+                                       (intercept,)).fetchone()
+
+# Class for the cache of compiled configurations (key schedules)
+# Includes:
+#   engines - compiled engines by normalized configuration key, least recently used first
+#   maxSize - number of configurations kept, the least recently used is evicted past it
+#   hits/misses/evictions - statistics, see stats()
+#
+#   Building the tables of a configuration is pure, so a configuration seen before is handed the same engine
+#
+class KeyScheduleCache:
+
+    def __init__(self, maxSize=256):
+        self.maxSize = maxSize
+        self.engines = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # Engine for a key, build() makes it on a miss
+    def engine(self, key, build):
+        with self.lock:
+            engine = self.engines.get(key)
+            if engine is not None:
+                self.engines.move_to_end(key)
+                self.hits += 1
+                return engine
+            self.misses += 1
+        engine = build()
+        with self.lock:
+            self.engines[key] = engine
+            self.engines.move_to_end(key)
+            while len(self.engines) > self.maxSize:
+                self.engines.popitem(last=False)
+                self.evictions += 1
+        return engine
+
+    def stats(self):
+        with self.lock:
+            return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                    'size': len(self.engines), 'maxSize': self.maxSize}
+
+    def clear(self):
+        with self.lock:
+            self.engines.clear()
+            self.hits = self.misses = self.evictions = 0
+
+# Configuration cache shared by every machine of this process
+keySchedule = KeyScheduleCache()
+
+# Class for the on-disk cache of scrambler tables
+# Includes:
+#   directory - where the tables live, one .npy file per scrambler configuration
+#   tables - tables mapped by this process, by scramblerKey, least recently used first
+#   maxTables - number of tables kept mapped, each mapping holds a file descriptor until it is evicted
+#
+#   A table is CompiledEnigma.coreArray - the rotor/reflector permutation of all 27**3 rotation codes, 511758 bytes.
+#   It is written once (to a temporary file, then renamed into place so readers never see half a table) and
+#   memory mapped read-only afterwards, so every worker process maps the same page cache instead of its own copy
+#
+class ScramblerCache:
+
+    VERSION = 1
+
+    def __init__(self, directory, maxTables=64):
+        self.directory = directory
+        self.maxTables = maxTables
+        self.tables = OrderedDict()
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, engine):
+        digest = hashlib.sha1(repr(engine.scramblerKey).encode('ascii')).hexdigest()
+        return os.path.join(self.directory, 'scrambler-v%d-%s.npy' % (self.VERSION, digest))
+
+    # Mapped table of an engine, computed and written on first use.  When the written table cannot be mapped
+    # (e.g. out of file descriptors) the table built in memory is returned instead
+    def table(self, engine):
+        with self.lock:
+            table = self.tables.get(engine.scramblerKey)
+            if table is not None:
+                self.tables.move_to_end(engine.scramblerKey)
+                return table
+        path = self.path(engine)
+        table = self.load(path)
+        if table is None:
+            built = engine.buildCoreArray()
+            self.write(path, built)
+            table = self.load(path)
+            if table is None:
+                return built
+        with self.lock:
+            self.tables[engine.scramblerKey] = table
+            self.tables.move_to_end(engine.scramblerKey)
+            while len(self.tables) > self.maxTables:
+                self.tables.popitem(last=False)
+        return table
+
+    def load(self, path):
+        try:
+            table = np.load(path, mmap_mode='r')
+        except (OSError, ValueError):
+            return None
+        if table.dtype != np.uint8 or table.shape != (27 ** 3 * 26,):
+            return None
+        return table
+
+    def write(self, path, table):
+        handle, temporary = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(handle, 'wb') as f:
+                np.save(f, table)
+            os.replace(temporary, path)
+        except BaseException:
+            os.unlink(temporary)
+            raise
+
+    # Write the tables of every unit of a sweep ahead of a run - units as from BombeMachine.searchUnits
+    def precompute(self, units, ringSetting=(1, 1, 1)):
+        for rotorOrder, reflector, navy in units:
+            self.table(unitEngine(rotorOrder, reflector, ringSetting, navy))
+
+# Installed scrambler cache of this process, None to build tables in memory
+scramblerCache = None
+
+def enableScramblerCache(directory):
+    global scramblerCache
+    if scramblerCache is None or scramblerCache.directory != directory:
+        scramblerCache = ScramblerCache(directory)
+    return scramblerCache
+
+def disableScramblerCache():
+    global scramblerCache
+    scramblerCache = None
+
+
+# Class for instrumentation counters and timing spans
+# Includes:
+#   counters - letters, rotorSteps (single rotor movements), doubleSteps, positionsTested, stops, contradictions
+#   spans - name -> [calls, seconds] of the timed phases
+#   onSpan - optional callback(name, seconds) after every timed phase
+#
+#   Nothing is recorded unless an instance is installed with enableMetrics.  The hot paths test the module
+#   global once per call (never per letter) and keep their counts in locals until the call is done
+#
+class EnigmaMetrics:
+
+    COUNTERS = ('letters', 'rotorSteps', 'doubleSteps', 'positionsTested', 'stops', 'contradictions')
+
+    def __init__(self, onSpan=None):
+        self.onSpan = onSpan
+        self.lock = threading.Lock()
+        self.counters = dict.fromkeys(self.COUNTERS, 0)
+        self.spans = {}
+
+    def count(self, **counts):
+        with self.lock:
+            for name, value in counts.items():
+                self.counters[name] = self.counters.get(name, 0) + value
+
+    def addSpan(self, name, seconds, calls=1):
+        with self.lock:
+            span = self.spans.setdefault(name, [0, 0.0])
+            span[0] += calls
+            span[1] += seconds
+        if self.onSpan is not None:
+            self.onSpan(name, seconds)
+
+    # with metrics.span('name'): ... - time a phase
+    def span(self, name):
+        return MetricsSpan(self, name)
+
+    # Counters and spans as plain data, the counters are reset when reset is set
+    def snapshot(self, reset=False):
+        with self.lock:
+            snapshot = {'counters': dict(self.counters), 'spans': {name: list(span) for name, span in self.spans.items()}}
+            if reset:
+                self.counters = dict.fromkeys(self.COUNTERS, 0)
+                self.spans = {}
+        return snapshot
+
+    # Add a snapshot taken elsewhere, e.g. in a process pool worker
+    def merge(self, snapshot):
+        self.count(**snapshot['counters'])
+        for name, (calls, seconds) in snapshot['spans'].items():
+            with self.lock:
+                span = self.spans.setdefault(name, [0, 0.0])
+                span[0] += calls
+                span[1] += seconds
+
+    def report(self):
+        snapshot = self.snapshot()
+        lines = ['%-16s %d' % (name, value) for name, value in snapshot['counters'].items()]
+        lines += ['%-16s %d calls %.3f s' % (name, calls, seconds) for name, (calls, seconds) in snapshot['spans'].items()]
+        return '\n'.join(lines)
+
+class MetricsSpan:
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.addSpan(self.name, time.perf_counter() - self.start)
+        return False
+
+# Installed metrics of this process, None when instrumentation is off
+metrics = None
+
+def enableMetrics(instance=None):
+    global metrics
+    metrics = instance if instance is not None else EnigmaMetrics()
+    return metrics
+
+def disableMetrics():
+    global metrics
+    metrics = None
+
+# Class for periodic progress reports of long runs
+# Includes:
+#   total - work units expected, done - work units finished so far, stops - stops found so far
+#   interval - seconds between reports, report - callback(message) for the report lines (stderr by default)
+#
+#   advance() is called after every unit, a line with throughput and ETA is written at most once per interval
+#   and once more by finish()
+#
+class ProgressReporter:
+
+    def __init__(self, total=0, interval=10.0, report=None):
+        self.total = total
+        self.interval = interval
+        self.report = report if report is not None else (lambda message: print(message, file=sys.stderr))
+        self.start(total)
+
+    def start(self, total):
+        self.total = total
+        self.done = 0
+        self.stops = 0
+        self.started = time.monotonic()
+        self.lastReport = self.started
+
+    def advance(self, units=1, stops=0):
+        self.done += units
+        self.stops += stops
+        now = time.monotonic()
+        if now - self.lastReport >= self.interval:
+            self.lastReport = now
+            self.report(self.message(now))
+
+    def finish(self):
+        self.report(self.message(time.monotonic()))
+
+    def message(self, now):
+        elapsed = now - self.started
+        rate = self.done / elapsed if elapsed > 0 else 0.0
+        eta = (self.total - self.done) / rate if rate > 0 else float('inf')
+        return '%d/%d units (%.1f%%), %.2f units/s, %d stops, elapsed %.0f s, ETA %s' % (
+            self.done, self.total, 100.0 * self.done / self.total if self.total else 100.0, rate, self.stops,
+            elapsed, '%.0f s' % eta if eta != float('inf') else '?')
+
+# Class for incremental encryption/decryption
+# Includes:
+#   machine - enigma the stream was opened on, its rotations are written back by finalize
+#   engine - compiled engine of the machine settings when the stream was opened
+#   rotations - [right, middle, left] rotations after the text seen so far
+#
+#   update(chunk) enciphers the next piece of text exactly as cryption would carry on from the last piece
+#   (str in -> str out, bytes in -> bytes out), nothing is buffered so memory does not grow with the text.
+#   Unlike cryption any text goes: lower case letters are enciphered as upper case, anything else that is not
+#   a letter (newlines, digits, punctuation) is passed through without stepping the rotors, as spaces are
+#
+class EnigmaStream:
+
+    UPPER = str.maketrans(alphabet.lower(), alphabet)
+    OTHER = re.compile('([^A-Z ]+)')
+
+    def __init__(self, enigma):
+        self.machine = enigma
+        self.engine = enigma.compile()
+        self.rotations = enigma.getRotorRotation()
+        self.binary = False
+
+    def update(self, chunk):
+        if isinstance(chunk, (bytes, bytearray)):
+            self.binary = True
+            return self.update(chunk.decode('latin-1')).encode('latin-1')
+        pieces = self.OTHER.split(chunk.translate(self.UPPER))
+        for i in range(0, len(pieces), 2):
+            pieces[i], self.rotations = self.engine.cryption(pieces[i], self.rotations)
+        return ''.join(pieces)
+
+    # Nothing is buffered, so the tail is empty - bytes if the stream was fed bytes
+    def finalize(self):
+        self.machine.setRotorRotation(self.rotations)
+        return b'' if self.binary else ''
+
+# Class for text edited in place (the interface boxes)
+# Includes:
+#   engine/rotations - compiled engine and start rotations the text is enciphered from
+#   text - plain text enciphered so far, with its encipherment one character per entry in ciphered
+#   positionRotations - rotations after each character, so an edit only re-enciphers from the first changed character
+#
+class IncrementalCryption:
+
+    def __init__(self, enigma):
+        self.reset(enigma)
+
+    # Start again from the current settings and rotations of the machine
+    def reset(self, enigma):
+        self.engine = enigma.compile()
+        self.rotations = enigma.getRotorRotation()
+        self.text = ''
+        self.ciphered = []
+        self.positionRotations = []
+
+    def update(self, text):
+        if text.startswith(self.text):
+            common = len(self.text)
+        else:
+            common = 0
+            limit = min(len(text), len(self.text))
+            while common < limit and text[common] == self.text[common]:
+                common += 1
+        del self.ciphered[common:]
+        del self.positionRotations[common:]
+        rotations = self.positionRotations[-1] if common else self.rotations
+        for letter in text[common:]:
+            cipheredLetter, rotations = self.engine.cryption(letter, rotations)
+            self.ciphered.append(cipheredLetter)
+            self.positionRotations.append(rotations)
+        self.text = text
+        return ''.join(self.ciphered)
+
+# Encrypt/decrypt a text or binary file object into another in fixed size buffers, returns characters written.
+# Characters other than letters pass through unchanged (see EnigmaStream)
+def streamCryption(enigma, source, destination, bufferSize=1 << 16):
+    stream = enigma.stream()
+    written = 0
+    while True:
+        chunk = source.read(bufferSize)
+        if not chunk:
+            break
+        destination.write(stream.update(chunk))
+        written += len(chunk)
+    destination.write(stream.finalize())
+    return written
+
+# Process pool workers for parallelCryption - the compiled engine is sent once per worker process
+workerEngine = None
+
+def cryptionWorkerInit(engine):
+    global workerEngine
+    workerEngine = engine
+
+def cryptionChunk(chunk, rotations):
+    return workerEngine.cryption(chunk, rotations)[0]
+
+# Process pool workers - one Bombe per worker process, with the crib menu built once
+#   bombeShard returns the stops of its units and, when the parent has metrics installed, the worker counters.
+#   Workers map the parent's ScramblerCache directory, if one is installed
+workerBombe = None
+
+def bombeWorkerInit(crib, encryptedText, cribPosition, instrumented=False, scramblerDirectory=None):
+    global workerBombe
+    if instrumented:
+        enableMetrics()
+    if scramblerDirectory is not None:
+        enableScramblerCache(scramblerDirectory)
+    workerBombe = BombeMachine.__new__(BombeMachine)
+    workerBombe.resetBombe()
+    workerBombe.setCrib(crib, encryptedText, cribPosition)
+    workerBombe.buildMenu()
+
+def bombeShard(shard, ringSetting, canonical=False):
+    stops = []
+    for rotorOrder, reflector, navy in shard:
+        stops.extend(workerBombe.testUnit(rotorOrder, reflector, navy, ringSetting, canonical))
+    workerBombe.settingsFound = []
+    return stops, metrics.snapshot(reset=True) if metrics is not None else None
+
+# Process pool workers for StopVerifier - one statistical attack on the intercept per worker process
+workerAttack = None
+
+def verifierWorkerInit(encryptedText, bigrams, trigrams):
+    global workerAttack
+    workerAttack = StatisticalAttack(encryptedText, bigrams, trigrams)
+
+def verifierChunk(stops, maxPairs, minScore):
+    return verifyStops(workerAttack, stops, maxPairs, minScore)
+
+# Names of from EnigmaCore import * - every public name but the numpy stand-in
+__all__ = [name for name in dir() if not name.startswith('_') and name not in ('np', 'LazyNumpy')]
@@ -0,0 +1,5 @@
+# The modules live side by side in EnigmaSimulation/ and import each other by name
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'EnigmaSimulation'))
@@ -0,0 +1,135 @@
+# Bombe key recovery, checkpoint resume and the results store
+
+import os
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from EnigmaCore import *
+
+PLAIN = 'WETTERVORHERSAGEFUERDIEREGIONNORDSEE'
+CRIB = 'WETTERVORHERSAGEFUERDIE'
+ROTOR_ORDERS = [(1, 2, 3), (2, 3, 4), (3, 2, 1), (4, 5, 1), (5, 4, 3), (1, 3, 5)]
+
+def encrypted(rotorOrder=(3, 2, 1), ringSetting=(1, 1, 1), plugboard='AQ BW CE DR FT GY', rotation=(7, 20, 3),
+              plain=PLAIN):
+    return EnigmaMachine.fromKey(rotorOrder, ringSetting, reflectorB, plugboard, None, rotation).cryption(plain)
+
+def bombe(encryptedText, crib=CRIB):
+    machine = BombeMachine()
+    machine.setCrib(crib, encryptedText)
+    return machine
+
+def stopKeys(stops):
+    return sorted((stop.rotorOrder, stop.ringSetting, tuple(stop.rotation), stop.plugboard) for stop in stops)
+
+# Stop deciphers the whole intercept
+def decrypts(stop, encryptedText, plain):
+    return MultiKeyEnigma([stop]).cryption(encryptedText)[0] == plain
+
+
+def testBombeFindsKnownKey():
+    encryptedText = encrypted()
+    stops = bombe(encryptedText).runBombe(ROTOR_ORDERS, [reflectorB])
+    found = [stop for stop in stops if stop.rotorOrder == (3, 2, 1) and stop.rotation == [7, 20, 3]]
+    assert found
+    assert set('AQ BW CE DR FT GY'.split()) <= set(found[0].plugboard.split())
+    assert decrypts(found[0], encryptedText, PLAIN)
+
+def testParallelMatchesSerial():
+    encryptedText = encrypted()
+    serial = bombe(encryptedText).runBombe(ROTOR_ORDERS, [reflectorB])
+    parallel = list(bombe(encryptedText).runBombeParallel(ROTOR_ORDERS, [reflectorB], workers=2, chunkSize=2))
+    assert stopKeys(parallel) == stopKeys(serial)
+
+# The ring (1, 1, 1) table read through ringStateMap is the table compiled at the ring setting
+def testRingStateMapMatchesCompiledRings():
+    base = unitEngine((3, 2, 1), reflectorB).stateArray().reshape(-1, 26)
+    rotation = np.arange(1, 27)
+    states = ((rotation[:, None, None] * 27 + rotation[None, :, None]) * 27 + rotation[None, None, :]).ravel()
+    for ringSetting in [(5, 9, 1), (26, 1, 13), (17, 3, 22)]:
+        compiled = unitEngine((3, 2, 1), reflectorB, ringSetting).stateArray().reshape(-1, 26)
+        assert (base[ringStateMap(ringSetting)[states]] == compiled[states]).all()
+
+def testBombeFindsKeyAtRingSetting():
+    encryptedText = encrypted(ringSetting=(5, 9, 1))
+    machine = bombe(encryptedText)
+    machine.buildMenu()
+    stops = machine.testRings((3, 2, 1), reflectorB, [(1, 1, 1), (5, 9, 1)])
+    assert any(stop.ringSetting == (5, 9, 1) and decrypts(stop, encryptedText, PLAIN) for stop in stops)
+
+def testCanonicalKeyEnciphersTheSame():
+    plain = PLAIN * 3
+    for ringSetting, rotation in [((5, 1, 1), (2, 1, 1)), ((12, 20, 3), (25, 4, 9)), ((1, 26, 26), (26, 5, 1))]:
+        ring, start = canonicalKey((1, 2, 3), ringSetting, rotation, len(plain))
+        original = EnigmaMachine.fromKey((1, 2, 3), ringSetting, reflectorB, '', None, rotation).cryption(plain)
+        canonical = EnigmaMachine.fromKey((1, 2, 3), ring, reflectorB, '', None, start).cryption(plain)
+        assert canonical == original
+
+
+class Interrupted(Exception):
+    pass
+
+class InterruptingProgress(ProgressReporter):
+
+    def __init__(self, after):
+        ProgressReporter.__init__(self, report=lambda message: None)
+        self.after = after
+
+    def advance(self, units=1, stops=0):
+        ProgressReporter.advance(self, units, stops)
+        if self.done >= self.after:
+            raise Interrupted()
+
+def testCheckpointResume(tmp_path):
+    encryptedText = encrypted()
+    path = str(tmp_path / 'sweep.jsonl')
+    expected = stopKeys(bombe(encryptedText).runBombe(ROTOR_ORDERS, [reflectorB]))
+    with pytest.raises(Interrupted):
+        bombe(encryptedText).runBombe(ROTOR_ORDERS, [reflectorB], progress=InterruptingProgress(3), checkpoint=path)
+    with open(path, 'ab') as f:
+        f.write(b'{"units":[4],"sto')
+
+    progress = ProgressReporter(report=lambda message: None)
+    resumed = bombe(encryptedText).runBombe(ROTOR_ORDERS, [reflectorB], progress=progress, checkpoint=path)
+    assert progress.total == len(ROTOR_ORDERS) - 3
+    assert stopKeys(resumed) == expected
+    with open(path, 'rb') as f:
+        assert f.read().count(b'\n') == 1 + len(ROTOR_ORDERS)
+
+def testCheckpointOfAnotherSweepIsRefusedUntouched(tmp_path):
+    path = str(tmp_path / 'sweep.jsonl')
+    bombe(encrypted()).runBombe(ROTOR_ORDERS[:2], [reflectorB], checkpoint=path)
+    with open(path, 'ab') as f:
+        f.write(b'{"units":[9')
+    with open(path, 'rb') as f:
+        before = f.read()
+    with pytest.raises(ValueError):
+        bombe(encrypted()).runBombe(ROTOR_ORDERS[:3], [reflectorB], checkpoint=path)
+    with open(path, 'rb') as f:
+        assert f.read() == before
+
+
+def testResultStore(tmp_path):
+    path = str(tmp_path / 'results.db')
+    stops = [BombeStop((1, 2, 3), reflectorB, (1, 1, 1), [r, 2, 3], 0, 'AB CD', (10, 5) if r % 2 else None)
+             for r in range(1, 27)]
+    verified = [VerifiedStop((1, 2, 3), reflectorB, (1, 1, 1), [r, 1, 1], 'AB', None, float(r), 'PLAIN')
+                for r in range(1, 27)]
+    with ResultStore(path, batchSize=10) as store:
+        store.addStops('X', stops)
+        store.addVerified('X', verified)
+        store.addVerified('Y', verified[:3])
+    with ResultStore(path) as store:
+        assert store.count('X') == (26, 26)
+        top = store.top('X', 5)
+        assert [candidate.score for candidate in top] == [26.0, 25.0, 24.0, 23.0, 22.0]
+        assert top[0] == verified[-1]._replace(rotorOrder=(1, 2, 3), ringSetting=(1, 1, 1))
+        assert stopKeys(store.stops('X')) == stopKeys(stops)
+        assert list(store.stops('X', rotorOrder=(2, 3, 4))) == []
+        assert len(list(store.stops('X', rotorOrder=(1, 2, 3), reflector=reflectorB))) == 26
+        assert [candidate.score for candidate in store.top('Y')] == [3.0, 2.0, 1.0]
+        plan = store.connection.execute('EXPLAIN QUERY PLAN SELECT score FROM stops WHERE intercept = ? AND score IS NOT NULL'
+                                        ' ORDER BY score DESC LIMIT 50', ('X',)).fetchall()
+        assert 'stopsScore' in str(plan)
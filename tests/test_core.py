@@ -0,0 +1,105 @@
+# Compiled and array engines against the per-letter reference path (rotateRotors + cipher)
+
+import random
+
+import pytest
+
+from EnigmaCore import *
+
+SEED = 1939
+
+def randomKey(generator, navy=False):
+    rotors = tuple(generator.sample(range(1, 9), 3))
+    ringSetting = tuple(generator.randint(1, 26) for i in range(3))
+    rotation = tuple(generator.randint(1, 26) for i in range(3))
+    letters = generator.sample(alphabet, 12)
+    plugboard = ' '.join(letters[i] + letters[i + 1] for i in range(0, 12, 2))
+    navyRotor = generator.choice([10, 11]) if navy else None
+    reflector = generator.choice([reflectorBt, reflectorCt]) if navy else generator.choice([reflectorB, reflectorC])
+    return rotors, ringSetting, reflector, plugboard, navyRotor, rotation
+
+def machine(key):
+    rotors, ringSetting, reflector, plugboard, navyRotor, rotation = key
+    return EnigmaMachine.fromKey(rotors, ringSetting, reflector, plugboard, navyRotor, rotation)
+
+# Letter by letter as the original cryption did.  The original cipher raises IndexError for some
+# letter/rotation pairs, those letters come back as None
+def referenceCryption(enigma, text):
+    ciphered = []
+    for letter in text:
+        enigma.rotateRotors()
+        try:
+            ciphered.append(enigma.cipher(letter))
+        except IndexError:
+            ciphered.append(None)
+    return ciphered
+
+def randomText(generator, length):
+    return ''.join(generator.choice(alphabet) for i in range(length))
+
+
+@pytest.mark.parametrize('navy', [False, True])
+def testCompiledMatchesReference(navy):
+    generator = random.Random(SEED)
+    compared = 0
+    for trial in range(20):
+        key = randomKey(generator, navy)
+        text = randomText(generator, 500)
+        compiled = machine(key)
+        ciphered = compiled.cryption(text)
+        reference = machine(key)
+        expected = referenceCryption(reference, text)
+        for letter, expectedLetter in zip(ciphered, expected):
+            if expectedLetter is not None:
+                assert letter == expectedLetter
+                compared += 1
+        assert compiled.getRotorRotation() == reference.getRotorRotation()
+    assert compared > 0.9 * 20 * 500
+
+def testCryptionIsInvolution():
+    generator = random.Random(SEED)
+    key = randomKey(generator)
+    text = randomText(generator, 2000)
+    assert machine(key).cryption(machine(key).cryption(text)) == text
+
+def testSpacesDoNotStep():
+    generator = random.Random(SEED)
+    key = randomKey(generator)
+    assert machine(key).cryption('ABC DEF').replace(' ', '') == machine(key).cryption('ABCDEF')
+
+def testSeekMatchesStepping():
+    generator = random.Random(SEED)
+    for trial in range(20):
+        key = randomKey(generator)
+        enigma = machine(key)
+        engine = enigma.compile()
+        count = generator.randint(0, 20000)
+        rotations = enigma.getRotorRotation()
+        for i in range(count):
+            enigma.rotateRotors()
+        assert engine.seek(rotations, count) == enigma.getRotorRotation()
+
+def testCryptionArrayMatchesCryption():
+    np = pytest.importorskip('numpy')
+    generator = random.Random(SEED)
+    key = randomKey(generator)
+    text = randomText(generator, 5000)
+    letters = np.frombuffer(text.encode('ascii'), dtype=np.uint8) - ord('A')
+    ciphered = machine(key).cryptionArray(letters)
+    assert (ciphered + ord('A')).tobytes().decode('ascii') == machine(key).cryption(text)
+
+@pytest.mark.parametrize('letters', [[-1], [26], [257], [1.5]])
+def testCryptionArrayRefusesBadLetters(letters):
+    np = pytest.importorskip('numpy')
+    with pytest.raises(ValueError):
+        machine(randomKey(random.Random(SEED))).cryptionArray(np.array(letters))
+
+def testMultiKeyMatchesSingleKeys():
+    pytest.importorskip('numpy')
+    generator = random.Random(SEED)
+    keys = [randomKey(generator, navy=k % 2 == 1) for k in range(8)]
+    text = randomText(generator, 300)
+    multiKeys = [EnigmaKey(rotors, reflector, ringSetting, rotation, plugboard,
+                           (navyRotor, 1) if navyRotor is not None else None)
+                 for rotors, ringSetting, reflector, plugboard, navyRotor, rotation in keys]
+    assert MultiKeyEnigma(multiKeys).cryption(text) == [machine(key).cryption(text) for key in keys]
@@ -0,0 +1,75 @@
+# Round trips through the stream and batch paths
+
+import io
+import json
+
+from EnigmaCore import *
+import EnigmaBatch
+
+TEXT = 'Weather report, North Sea:\nwind 4-5 from the west\n\nvisibility good.\n'
+
+def machine():
+    return EnigmaMachine.fromKey((2, 4, 5), (3, 7, 1), reflectorB, 'AQ BW CE', None, (7, 20, 3))
+
+
+def testStreamRoundTrip():
+    ciphered = io.StringIO()
+    assert streamCryption(machine(), io.StringIO(TEXT), ciphered, bufferSize=7) == len(TEXT)
+    plain = io.StringIO()
+    streamCryption(machine(), io.StringIO(ciphered.getvalue()), plain, bufferSize=11)
+    assert plain.getvalue() == TEXT.upper()
+
+def testStreamMatchesCryption():
+    ciphered = io.StringIO()
+    streamCryption(machine(), io.StringIO(TEXT), ciphered, bufferSize=5)
+    letters = ''.join(letter for letter in TEXT.upper() if letter in alphabet)
+    assert ''.join(letter for letter in ciphered.getvalue() if letter in alphabet) == machine().cryption(letters)
+
+def testByteStreamRoundTrip():
+    data = TEXT.encode('ascii') + b'\xe9\x00'
+    ciphered = io.BytesIO()
+    streamCryption(machine(), io.BytesIO(data), ciphered, bufferSize=9)
+    plain = io.BytesIO()
+    streamCryption(machine(), io.BytesIO(ciphered.getvalue()), plain, bufferSize=4)
+    assert plain.getvalue() == TEXT.upper().encode('ascii') + b'\xe9\x00'
+
+def testStreamFinalizeMatchesChunkType():
+    stream = machine().stream()
+    stream.update(b'ABC')
+    assert stream.finalize() == b''
+    stream = machine().stream()
+    stream.update('ABC')
+    assert stream.finalize() == ''
+
+
+MESSAGES = [
+    {'id': 1, 'text': 'HELLO WORLD', 'rotors': [1, 2, 3], 'ringSetting': [4, 5, 6], 'rotorRotation': [7, 8, 9],
+     'reflector': 'C', 'plugboard': 'AB CD'},
+    {'id': 2, 'text': 'ATTACK AT DAWN', 'rotors': '2 4 5', 'navyRotor': 10, 'reflector': 'Bt'},
+    {'id': 3, 'text': 'NO KEY FIELDS'},
+    ]
+
+def batch(messages, workers=1):
+    return list(EnigmaBatch.cryptMessages(iter(messages), workers=workers, batchSize=2))
+
+def testBatchRoundTrip():
+    ciphered = batch(MESSAGES)
+    assert [result['id'] for result in ciphered] == [1, 2, 3]
+    replies = [dict(message, text=result['text']) for message, result in zip(MESSAGES, ciphered)]
+    assert [result['text'] for result in batch(replies)] == [message['text'] for message in MESSAGES]
+
+def testBatchMatchesMachine():
+    result = batch(MESSAGES[:1])[0]
+    expected = EnigmaMachine.fromKey((1, 2, 3), (4, 5, 6), reflectorC, 'AB CD', None, (7, 8, 9)).cryption('HELLO WORLD')
+    assert result['text'] == expected
+
+def testBatchPoolMatchesInline():
+    assert batch(MESSAGES * 3, workers=2) == batch(MESSAGES * 3)
+
+def testBadMessagesBecomeErrorRows():
+    source = io.StringIO('\n'.join([json.dumps(MESSAGES[0]), '{"id": 5, "text":', json.dumps({'id': 6, 'rotors': [1, 2, 9]}),
+                                    json.dumps({'id': 7, 'plugboard': 5}), '[1, 2]', json.dumps(MESSAGES[2])]) + '\n')
+    results = list(EnigmaBatch.cryptMessages(EnigmaBatch.readMessages(source, 'jsonl'), workers=1))
+    assert [('text' in result, result['id']) for result in results] == \
+        [(True, 1), (False, None), (False, 6), (False, 7), (False, None), (True, 3)]
+    assert results[1]['error'].startswith('line 2:')